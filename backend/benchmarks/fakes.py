@@ -0,0 +1,213 @@
+"""Local stand-ins for Gemini and the grounded Google Search, used by the benchmarks.
+
+Responses are derived from a hash of the prompt, so a benchmark run is
+reproducible, and their latency is drawn from a log-normal distribution.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from src.agent.prompt_cache import local_cached_prefix
+
+
+SHORT_URL_RE = re.compile(r"https://vertexaisearch\.cloud\.google\.com/id/[0-9a-f]+")
+
+# Latencies come from one seeded generator, content from a hash of the prompt
+_latency_rng = random.Random(0)
+
+
+def seed_latencies(seed: int) -> None:
+    _latency_rng.seed(seed)
+
+
+WORDS = (
+    "battery grid storage solar wind policy market price capacity demand supply "
+    "efficiency emissions carbon hydrogen nuclear transmission forecast investment "
+    "subsidy regulation adoption lithium sodium recycling cost outlook region"
+).split()
+
+
+@dataclass
+class LatencyModel:
+    """Log-normal latency, `median_ms` is the median and `sigma` the spread."""
+
+    median_ms: float
+    sigma: float = 0.5
+
+    def sample(self) -> float:
+        """Draw a latency in seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        return _latency_rng.lognormvariate(math.log(self.median_ms / 1000), self.sigma)
+
+
+def _rng(*parts: Any) -> random.Random:
+    seed = hashlib.sha256("\n".join(str(part) for part in parts).encode()).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _fake_queries(rng: random.Random, count: int) -> List[str]:
+    return [" ".join(rng.sample(WORDS, 4)) for _ in range(count)]
+
+
+class FakeGeminiChat(BaseChatModel):
+    """Chat model answering every prompt of the agent with plausible content."""
+
+    model: str = "fake-gemini"
+    latency: LatencyModel = LatencyModel(0)
+    output_tokens: int = 200
+    follow_up_loops: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model": self.model}
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params["ls_model_name"] = self.model
+        return params
+
+    def _respond(self, messages: List[BaseMessage], schema_name: Optional[str]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = _rng(self.model, schema_name, prompt)
+        if schema_name == "Intention":
+            return json.dumps({"intention": "web_research"})
+        if schema_name in ("SearchQueryList", "IntentionAndQueries"):
+            payload = {"query": _fake_queries(rng, 3), "rationale": _sentence(rng)}
+            if schema_name == "IntentionAndQueries":
+                payload["intention"] = "web_research"
+            return json.dumps(payload)
+        if schema_name == "Reflection":
+            # the summaries of the web research results are separated by rules
+            searches = prompt.rsplit("Summaries:", 1)[-1].count("\n---\n") + 1
+            done = searches >= 3 + 2 * self.follow_up_loops
+            return json.dumps({
+                "is_sufficient": done,
+                "knowledge_gap": "" if done else _sentence(rng),
+                "follow_up_queries": [] if done else _fake_queries(rng, 2),
+            })
+        if messages and isinstance(messages[0], SystemMessage):
+            # memory extraction
+            return json.dumps([f"The user is interested in {_sentence(rng, 5)}" for _ in range(3)])
+        # answer, digests and summaries, citing some of the short urls of the prompt
+        short_urls = list(dict.fromkeys(SHORT_URL_RE.findall(prompt)))
+        sentences = []
+        for index in range(max(self.output_tokens // 16, 1)):
+            sentence = _sentence(rng)
+            if short_urls and index % 2 == 0:
+                sentence += f" [source]({rng.choice(short_urls)})"
+            sentences.append(sentence)
+        return " ".join(sentences)
+
+    def _result(
+        self, messages: List[BaseMessage], schema_name: Optional[str], cached_content: Optional[str]
+    ) -> ChatResult:
+        content = self._respond(messages, schema_name)
+        # Like Gemini, the tokens of the cached prefix count as input tokens read from cache
+        cached_tokens = len(local_cached_prefix(cached_content) or "") // 4 if cached_content else 0
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4 + cached_tokens
+        output_tokens = len(content) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {"cache_read": cached_tokens},
+            },
+            response_metadata={"model_name": self.model},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, schema_name=None, cached_content=None, **kwargs):
+        time.sleep(self.latency.sample())
+        return self._result(messages, schema_name, cached_content)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, schema_name=None, cached_content=None, **kwargs):
+        await asyncio.sleep(self.latency.sample())
+        return self._result(messages, schema_name, cached_content)
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        return self.bind(schema_name=schema.__name__) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content)
+        )
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents: str, config: Any = None):
+        time.sleep(self._client.latency.sample())
+        return self._client.response(model, contents)
+
+
+class _FakeAsyncModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents: str, config: Any = None):
+        await asyncio.sleep(self._client.latency.sample())
+        return self._client.response(model, contents)
+
+
+class FakeGenaiClient:
+    """Stand-in for `genai.Client` returning grounded responses with citation metadata."""
+
+    def __init__(self, latency: LatencyModel, sources: tuple[int, int] = (3, 8), sentences: int = 8):
+        self.latency = latency
+        self.sources = sources
+        self.sentences = sentences
+        self.models = _FakeModels(self)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
+
+    def response(self, model: str, contents: str) -> SimpleNamespace:
+        rng = _rng(model, contents)
+        chunks = [
+            SimpleNamespace(web=SimpleNamespace(
+                uri=f"https://example.com/{rng.randrange(10_000)}/{index}",
+                title=f"{rng.choice(WORDS)}-{index}.example.com",
+            ))
+            for index in range(rng.randint(*self.sources))
+        ]
+        text, supports = "", []
+        for _ in range(self.sentences):
+            sentence = _sentence(rng, rng.randint(8, 20))
+            start = len(text)
+            text += sentence + " "
+            indices = rng.sample(range(len(chunks)), k=min(len(chunks), rng.randint(1, 2)))
+            supports.append(SimpleNamespace(
+                segment=SimpleNamespace(start_index=start, end_index=start + len(sentence)),
+                grounding_chunk_indices=indices,
+            ))
+        metadata = SimpleNamespace(grounding_chunks=chunks, grounding_supports=supports)
+        return SimpleNamespace(
+            text=text.rstrip(),
+            candidates=[SimpleNamespace(grounding_metadata=metadata)],
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(contents) // 4,
+                candidates_token_count=len(text) // 4,
+                cached_content_token_count=0,
+            ),
+        )
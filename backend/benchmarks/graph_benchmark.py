@@ -0,0 +1,270 @@
+"""Drive the agent graph offline with fake Gemini and search backends.
+
+Run from the backend directory:
+
+    python -m benchmarks.graph_benchmark --runs 50 --concurrency 8 --mode async
+
+Reports the throughput, the run and per-node latency percentiles, the memory
+growth and the long-term memory store calls. Any `Configuration` field can be
+set with `--config name=value`.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langgraph.store.memory import InMemoryStore
+
+from benchmarks.fakes import FakeGeminiChat, FakeGenaiClient, LatencyModel, seed_latencies
+from src.agent.clients import set_client_factories
+from src.agent.graph import builder
+
+
+QUESTIONS = [
+    "What is the outlook for grid scale battery storage prices?",
+    "How do sodium batteries compare to lithium for home storage?",
+    "Which regions lead offshore wind investment this year?",
+    "What policies drive hydrogen adoption in heavy industry?",
+]
+
+
+class CountingStore(InMemoryStore):
+    """In-memory store counting its round trips, every store API goes through `batch`."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def _count(self) -> None:
+        with self._calls_lock:
+            self.calls += 1
+
+    def batch(self, ops):
+        self._count()
+        return super().batch(ops)
+
+    async def abatch(self, ops):
+        self._count()
+        return await super().abatch(ops)
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects the wall time of every graph node execution."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._started: dict[UUID, tuple[str, float]] = {}
+        self.durations: dict[str, list[float]] = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            with self._lock:
+                # The node's task and the runnable inside it share the name, time the outer one
+                if parent_run_id not in self._started:
+                    self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                node, started_at = started
+                self.durations[node].append(time.perf_counter() - started_at)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._started.pop(run_id, None)
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def _parse_config(pairs: list[str]) -> dict[str, Any]:
+    configurable = {}
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        try:
+            configurable[name] = json.loads(value)
+        except json.JSONDecodeError:
+            configurable[name] = value
+    return configurable
+
+
+def install_fakes(args: argparse.Namespace) -> None:
+    seed_latencies(args.seed)
+    llm_latency = LatencyModel(args.llm_latency_ms, args.latency_sigma)
+    set_client_factories(
+        chat_model_factory=lambda model, temperature, max_retries: FakeGeminiChat(
+            model=model,
+            latency=llm_latency,
+            output_tokens=args.answer_tokens,
+            follow_up_loops=args.follow_up_loops,
+        ),
+        genai_client_factory=lambda: FakeGenaiClient(
+            LatencyModel(args.search_latency_ms, args.latency_sigma),
+            sources=(args.min_sources, args.max_sources),
+        ),
+    )
+
+
+def _run_input(index: int, args: argparse.Namespace) -> dict[str, Any]:
+    return {
+        "messages": [HumanMessage(content=QUESTIONS[index % len(QUESTIONS)])],
+        "initial_search_query_count": args.initial_queries,
+        "max_research_loops": args.max_loops,
+    }
+
+
+def _run_config(index: int, timer: NodeTimer, configurable: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "callbacks": [timer],
+        "configurable": {"thread_id": f"benchmark-{index}", **configurable},
+    }
+
+
+def run_sync(graph, args, timer, configurable) -> list[tuple[float, dict[str, Any]]]:
+    def one(index: int) -> tuple[float, dict[str, Any]]:
+        started_at = time.perf_counter()
+        result = graph.invoke(_run_input(index, args), _run_config(index, timer, configurable))
+        return time.perf_counter() - started_at, result.get("run_usage") or {}
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        return list(executor.map(one, range(args.runs)))
+
+
+async def run_async(graph, args, timer, configurable) -> list[tuple[float, dict[str, Any]]]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(index: int) -> tuple[float, dict[str, Any]]:
+        async with semaphore:
+            started_at = time.perf_counter()
+            result = await graph.ainvoke(_run_input(index, args), _run_config(index, timer, configurable))
+            return time.perf_counter() - started_at, result.get("run_usage") or {}
+
+    return await asyncio.gather(*(one(index) for index in range(args.runs)))
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark(args: argparse.Namespace) -> dict[str, Any]:
+    install_fakes(args)
+    store = CountingStore()
+    graph = builder.compile(store=store)
+    timer = NodeTimer()
+    configurable = _parse_config(args.config)
+
+    rss_before = _max_rss_mb()
+    if args.trace_memory:
+        tracemalloc.start()
+    started_at = time.perf_counter()
+    if args.mode == "async":
+        runs = asyncio.run(run_async(graph, args, timer, configurable))
+    else:
+        runs = run_sync(graph, args, timer, configurable)
+    elapsed = time.perf_counter() - started_at
+    run_times = [run_time for run_time, _ in runs]
+    traced_peak = None
+    if args.trace_memory:
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "mode": args.mode,
+        "runs": args.runs,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": elapsed,
+        "throughput_runs_per_second": args.runs / elapsed,
+        "run_seconds": percentiles(run_times),
+        "node_seconds": {
+            node: {"count": len(durations), **percentiles(durations)}
+            for node, durations in sorted(timer.durations.items())
+        },
+        "tokens_per_run": {
+            counter: sum(usage.get(counter, 0) for _, usage in runs) / args.runs
+            for counter in ("input_tokens", "cached_tokens", "output_tokens")
+        },
+        "store_calls": store.calls,
+        "store_calls_per_run": store.calls / args.runs,
+        "max_rss_growth_mb": _max_rss_mb() - rss_before,
+        "traced_peak_mb": traced_peak / 2**20 if traced_peak is not None else None,
+    }
+
+
+def _print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{report['runs']} runs, {report['mode']}, concurrency {report['concurrency']}: "
+        f"{report['elapsed_seconds']:.2f}s, {report['throughput_runs_per_second']:.2f} runs/s"
+    )
+    run = report["run_seconds"]
+    print(f"run latency  p50 {run['p50'] * 1000:8.1f} ms  p95 {run['p95'] * 1000:8.1f} ms  p99 {run['p99'] * 1000:8.1f} ms")
+    print(f"{'node':<18}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for node, stats in report["node_seconds"].items():
+        print(
+            f"{node:<18}{stats['count']:>7}{stats['p50'] * 1000:>11.1f}"
+            f"{stats['p95'] * 1000:>11.1f}{stats['p99'] * 1000:>11.1f}"
+        )
+    tokens = report["tokens_per_run"]
+    print(
+        f"tokens per run  input {tokens['input_tokens']:.0f} (cached {tokens['cached_tokens']:.0f})"
+        f"  output {tokens['output_tokens']:.0f}"
+    )
+    print(f"store calls  {report['store_calls']} ({report['store_calls_per_run']:.1f} per run)")
+    print(f"max rss growth  {report['max_rss_growth_mb']:.1f} MB")
+    if report["traced_peak_mb"] is not None:
+        print(f"traced python peak  {report['traced_peak_mb']:.1f} MB")
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the agent graph offline")
+    parser.add_argument("--runs", type=int, default=20, help="Number of graph runs")
+    parser.add_argument("--concurrency", type=int, default=4, help="Runs in flight at once")
+    parser.add_argument("--mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="Median model latency")
+    parser.add_argument("--search-latency-ms", type=float, default=100, help="Median search latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Spread of the log-normal latencies")
+    parser.add_argument("--min-sources", type=int, default=3, help="Fewest sources of a search result")
+    parser.add_argument("--max-sources", type=int, default=8, help="Most sources of a search result")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="Size of the free-text responses")
+    parser.add_argument("--initial-queries", type=int, default=3, help="Number of initial search queries")
+    parser.add_argument("--max-loops", type=int, default=2, help="Maximum number of research loops")
+    parser.add_argument("--follow-up-loops", type=int, default=1, help="Loops after which reflection is satisfied")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latencies")
+    parser.add_argument("--trace-memory", action="store_true", help="Track the Python heap peak (slower)")
+    parser.add_argument("--config", action="append", default=[], metavar="NAME=VALUE",
+                        help="Configuration override, e.g. --config intent_mode=combined")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = parse_args(argv)
+    report = benchmark(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
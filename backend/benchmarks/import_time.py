@@ -0,0 +1,110 @@
+"""Check the cold import time of the graph against a budget.
+
+Run from the backend directory:
+
+    python -m benchmarks.import_time --budget-ms 1500
+
+Imports the graph in fresh interpreters with `python -X importtime`, reports
+the median import time and the slowest modules, and exits with status 1 when
+the median is over the budget or when a module that must stay lazy (the Gemini
+SDKs, langmem) was imported, so it can run as a CI check.
+"""
+import argparse
+import json
+import os
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any, Optional
+
+# Imported with the first client or tool, never by importing the graph
+LAZY_MODULES = ("google.genai", "langchain_google_genai", "langmem")
+
+# The graph is imported as `src.agent.graph` from the backend directory
+BACKEND_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+_IMPORT_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _import_once(module: str) -> tuple[float, dict[str, int], list[str]]:
+    """Import `module` in a fresh interpreter.
+
+    Returns:
+        The total milliseconds, the cumulative microseconds of the modules the
+        imported ones import directly, and the lazy modules that were imported.
+    """
+    check = f"import sys, {module}; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=BACKEND_DIR,
+        check=True,
+    )
+    total, direct = 0, {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_LINE_RE.match(line)
+        if not match:
+            continue
+        # Every nesting level indents by two, the script's own imports by one
+        depth = len(match.group(3))
+        if depth == 1:
+            total += int(match.group(2))
+        elif depth == 3:
+            direct[match.group(4)] = int(match.group(2))
+    return total / 1000, direct, completed.stdout.split()
+
+
+def measure(module: str, runs: int) -> dict[str, Any]:
+    totals, slowest, lazy_imported = [], {}, set()
+    for _ in range(runs):
+        total_ms, direct, imported = _import_once(module)
+        totals.append(total_ms)
+        lazy_imported.update(imported)
+        for name, microseconds in direct.items():
+            slowest[name] = max(slowest.get(name, 0), microseconds)
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": statistics.median(totals),
+        "max_ms": max(totals),
+        "slowest_modules_ms": {
+            name: microseconds / 1000
+            for name, microseconds in sorted(slowest.items(), key=lambda item: -item[1])[:10]
+        },
+        "lazy_modules_imported": sorted(lazy_imported),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check the import time of the agent graph")
+    parser.add_argument("--module", default="src.agent.graph", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Budget of the median import time")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = measure(args.module, args.runs)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {report['module']}: median {report['median_ms']:.0f} ms, max {report['max_ms']:.0f} ms ({args.runs} runs)")
+        for name, milliseconds in report["slowest_modules_ms"].items():
+            print(f"  {name:<40}{milliseconds:>9.1f} ms")
+
+    failures = []
+    if report["median_ms"] > args.budget_ms:
+        failures.append(f"median import time {report['median_ms']:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if report["lazy_modules_imported"]:
+        failures.append(f"imported at import time: {', '.join(report['lazy_modules_imported'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
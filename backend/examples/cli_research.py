@@ -1,4 +1,6 @@
 import argparse
+import sys
+
 from langchain_core.messages import HumanMessage
 from agent.graph import graph
 
@@ -33,7 +35,18 @@ def main() -> None:
         "reasoning_model": args.reasoning_model,
     }
 
-    result = graph.invoke(state)
+    result = {}
+    for mode, chunk in graph.stream(state, stream_mode=["custom", "values"]):
+        if mode == "custom" and chunk.get("event") == "web_research":
+            # Progress goes to stderr so the answer can still be piped
+            cached = ", cached" if chunk["cached"] else ""
+            print(
+                f"[{chunk['id']}] {chunk['query']} - {chunk['source_count']} sources "
+                f"in {chunk['latency_ms']} ms{cached}",
+                file=sys.stderr,
+            )
+        elif mode == "values":
+            result = chunk
     messages = result.get("messages", [])
     if messages:
         print(messages[-1].content)
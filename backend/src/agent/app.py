@@ -1,10 +1,35 @@
 # mypy: disable - error - code = "no-untyped-def,misc"
+import logging
+import os
 import pathlib
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 
+from src.agent.instrumentation import metrics_payload
+
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the model clients before serving when AGENT_WARM_UP is set."""
+    if os.getenv("AGENT_WARM_UP", "").lower() in ("1", "true", "yes"):
+        from src.agent.warmup import warm_up
+
+        try:
+            stats = warm_up()
+            logger.info("Warm-up done in %ss", stats["seconds"], extra={"warm_up": stats})
+        except Exception:
+            # The first run builds what is missing, a failed warm-up must not stop the server
+            logger.warning("Warm-up failed", exc_info=True)
+    yield
+
+
 # Define the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 def create_frontend_router(build_dir="../frontend/dist"):
@@ -37,6 +62,20 @@ def create_frontend_router(build_dir="../frontend/dist"):
     return StaticFiles(directory=build_path, html=True)
 
 
+@app.get("/metrics")
+def metrics():
+    """Expose the agent's node, model and store metrics to Prometheus."""
+    payload = metrics_payload()
+    if payload is None:
+        return Response(
+            "Metrics disabled. Install prometheus-client to enable them.",
+            media_type="text/plain",
+            status_code=503,
+        )
+    content, content_type = payload
+    return Response(content, media_type=content_type)
+
+
 # Mount the frontend under /app to not conflict with the LangGraph API routes
 app.mount(
     "/app",
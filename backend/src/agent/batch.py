@@ -0,0 +1,250 @@
+"""Run many research questions through the graph at once.
+
+    python -m src.agent.batch questions.jsonl results.jsonl --concurrency 8
+
+Each input line is a question string or an object with a `question` key and
+optionally `id`, `initial_search_query_count`, `max_research_loops` and
+`reasoning_model`. Answers are appended to the output file as soon as a
+question is done, and the output file is also the checkpoint: running the same
+command again skips the questions already answered and retries the failed
+ones. Failures go to a separate errors file (`results.errors.jsonl` next to
+`results.jsonl`), so the output file holds one record per answered id.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable, Iterator, Optional, Union
+
+from langchain_core.messages import HumanMessage
+from langgraph.store.base import BaseStore
+from langgraph.store.memory import InMemoryStore
+
+
+logger = logging.getLogger(__name__)
+
+STATE_KEYS = ("initial_search_query_count", "max_research_loops", "reasoning_model")
+
+
+@dataclass
+class BatchReport:
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Questions answered per second, the skipped ones excluded."""
+        done = self.succeeded + self.failed
+        return done / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+def read_questions(path: str) -> Iterator[dict[str, Any]]:
+    """Read the questions of a JSONL file lazily, numbering those without an id."""
+    with open(path) as file:
+        for index, line in enumerate(file):
+            if line.strip():
+                yield _as_item(json.loads(line), index)
+
+
+def _as_item(question: Union[str, dict[str, Any]], index: int) -> dict[str, Any]:
+    item = {"question": question} if isinstance(question, str) else dict(question)
+    item.setdefault("id", str(index))
+    item["id"] = str(item["id"])
+    return item
+
+
+def default_errors_path(output_path: str) -> str:
+    """The errors file next to an output file, `results.errors.jsonl` for `results.jsonl`."""
+    root, extension = os.path.splitext(output_path)
+    return f"{root}.errors{extension or '.jsonl'}"
+
+
+def answered_ids(output_path: str) -> set[str]:
+    """The ids already answered in an output file, the checkpoint of a resumed batch."""
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # last line of a batch killed mid-write
+                continue
+            # Output files of older versions also hold the failures
+            if record.get("error") is None:
+                done.add(str(record["id"]))
+    return done
+
+
+def _run_state(item: dict[str, Any]) -> dict[str, Any]:
+    state = {"messages": [HumanMessage(content=item["question"])]}
+    state.update({key: item[key] for key in STATE_KEYS if key in item})
+    return state
+
+
+def _result_record(item: dict[str, Any], result: dict[str, Any], seconds: float) -> dict[str, Any]:
+    messages = result.get("messages") or []
+    sources = list(dict.fromkeys(source["value"] for source in result.get("sources_gathered") or []))
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "answer": messages[-1].content if messages else None,
+        "sources": sources,
+        "seconds": round(seconds, 3),
+        "error": None,
+    }
+
+
+def _drop_partial_line(output_path: str) -> None:
+    """Cut the record a killed batch was writing, so appended records start on their own line."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as file:
+        content = file.read()
+        if content and not content.endswith(b"\n"):
+            file.truncate(content.rfind(b"\n") + 1)
+
+
+class _ResultWriter:
+    def __init__(self, output_path: str):
+        _drop_partial_line(output_path)
+        self._file = open(output_path, "a")
+
+    def write(self, record: dict[str, Any]) -> None:
+        # Flushed per record, a crash loses at most the questions in flight
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def arun_batch(
+    questions: Iterable[Union[str, dict[str, Any]]],
+    output_path: str,
+    concurrency: int = 4,
+    configurable: Optional[dict[str, Any]] = None,
+    store: Optional[BaseStore] = None,
+    graph=None,
+    errors_path: Optional[str] = None,
+) -> BatchReport:
+    """Answer every question with at most `concurrency` runs in flight.
+
+    The runs share the process' client pool, search cache and memory store. The
+    search cache defaults to the in-memory one, so repeated queries across
+    questions are searched once.
+
+    Args:
+        questions: Question strings or dicts, read lazily.
+        output_path: JSONL file the answers are appended to, and resumed from.
+            It holds one record per answered id.
+        concurrency: Maximum number of graph runs in flight.
+        configurable: Configuration overrides applied to every run.
+        store: Long-term memory store of the runs, an in-memory one by default.
+        graph: Compiled graph to run, `builder` compiled with `store` by default.
+        errors_path: JSONL file the failures are appended to, `default_errors_path`
+            by default. A question failing again on resume adds another record.
+    """
+    if graph is None:
+        from src.agent.graph import builder
+
+        graph = builder.compile(store=store if store is not None else InMemoryStore())
+    configurable = {"search_cache": "memory", **(configurable or {})}
+
+    report = BatchReport()
+    done = answered_ids(output_path)
+    writer = _ResultWriter(output_path)
+    errors_writer = _ResultWriter(errors_path or default_errors_path(output_path))
+    items = (_as_item(question, index) for index, question in enumerate(questions))
+
+    async def worker() -> None:
+        # Workers pull from the shared iterator, so a huge input is never held in memory
+        for item in items:
+            report.total += 1
+            if item["id"] in done:
+                report.skipped += 1
+                continue
+            started_at = time.perf_counter()
+            try:
+                result = await graph.ainvoke(
+                    _run_state(item),
+                    {"configurable": {"thread_id": f"batch-{item['id']}", **configurable}},
+                )
+                record = _result_record(item, result, time.perf_counter() - started_at)
+            except Exception as error:
+                logger.warning(
+                    "Question %s failed: %s", item["id"], error, extra={"question_id": item["id"]}
+                )
+                errors_writer.write({"id": item["id"], "question": item["question"], "error": repr(error)})
+                report.failed += 1
+                continue
+            writer.write(record)
+            report.succeeded += 1
+
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        writer.close()
+        errors_writer.close()
+        report.elapsed_seconds = time.perf_counter() - started_at
+    return report
+
+
+def run_batch(
+    questions: Iterable[Union[str, dict[str, Any]]],
+    output_path: str,
+    concurrency: int = 4,
+    configurable: Optional[dict[str, Any]] = None,
+    store: Optional[BaseStore] = None,
+    graph=None,
+    errors_path: Optional[str] = None,
+) -> BatchReport:
+    """Sync entry point of `arun_batch`."""
+    return asyncio.run(
+        arun_batch(questions, output_path, concurrency, configurable, store, graph, errors_path)
+    )
+
+
+def _parse_config(pairs: list[str]) -> dict[str, Any]:
+    configurable = {}
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        try:
+            configurable[name] = json.loads(value)
+        except json.JSONDecodeError:
+            configurable[name] = value
+    return configurable
+
+
+def main() -> None:
+    """Run a batch of research questions from the command line."""
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of research questions")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("output", help="JSONL file the answers are appended to")
+    parser.add_argument("--errors", help="JSONL file the failures are appended to, OUTPUT.errors.jsonl by default")
+    parser.add_argument("--concurrency", type=int, default=4, help="Runs in flight at once")
+    parser.add_argument("--config", action="append", default=[], metavar="NAME=VALUE",
+                        help="Configuration override, e.g. --config max_research_loops=1")
+    args = parser.parse_args()
+
+    report = run_batch(
+        read_questions(args.input),
+        args.output,
+        concurrency=args.concurrency,
+        configurable=_parse_config(args.config),
+        errors_path=args.errors,
+    )
+    print(json.dumps({**asdict(report), "throughput_per_second": round(report.throughput, 3)}))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Optional, TypedDict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+
+class RunUsage(TypedDict, total=False):
+    """What a run has spent so far, kept in state under `run_usage`."""
+
+    started_at: float
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+    # The part of input_tokens served from the provider's context cache
+    cached_tokens: int
+
+
+_COUNTERS = ("llm_calls", "input_tokens", "output_tokens", "cached_tokens")
+
+
+def new_run_usage() -> RunUsage:
+    return {
+        "started_at": time.time(),
+        "llm_calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+    }
+
+
+def add_run_usage(left: Optional[RunUsage], right: Optional[RunUsage]) -> Optional[RunUsage]:
+    """Reducer of `run_usage`: sums the node usages, an update with `started_at` starts a new run."""
+    if right is None:
+        return left
+    if left is None or "started_at" in right:
+        return dict(right)
+    return {
+        **left,
+        **{counter: left.get(counter, 0) + right.get(counter, 0) for counter in _COUNTERS},
+    }
+
+
+class _UsageHandler(BaseCallbackHandler):
+    """Counts the model calls and tokens of one node execution."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.usage = {counter: 0 for counter in _COUNTERS}
+
+    def _add(self, input_tokens: int, output_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            self.usage["llm_calls"] += 1
+            self.usage["input_tokens"] += input_tokens
+            self.usage["output_tokens"] += output_tokens
+            self.usage["cached_tokens"] += cached_tokens
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        usage_metadata = None
+        if response.generations and response.generations[0]:
+            generation = response.generations[0][0]
+            if isinstance(generation, ChatGeneration):
+                usage_metadata = getattr(generation.message, "usage_metadata", None)
+        usage_metadata = usage_metadata or {}
+        self._add(
+            usage_metadata.get("input_tokens", 0),
+            usage_metadata.get("output_tokens", 0),
+            (usage_metadata.get("input_token_details") or {}).get("cache_read", 0),
+        )
+
+    def add_search(self, response) -> None:
+        usage_metadata = getattr(response, "usage_metadata", None)
+        self._add(
+            getattr(usage_metadata, "prompt_token_count", None) or 0,
+            getattr(usage_metadata, "candidates_token_count", None) or 0,
+            getattr(usage_metadata, "cached_content_token_count", None) or 0,
+        )
+
+    def add_to(self, update: Any) -> Any:
+        if not isinstance(update, dict) or not any(self.usage.values()):
+            return update
+        return {**update, "run_usage": dict(self.usage)}
+
+
+# Every chat model call made while a node runs reports to the node's handler
+_usage_handler_var: ContextVar[Optional[_UsageHandler]] = ContextVar(
+    "run_usage_handler", default=None
+)
+register_configure_hook(_usage_handler_var, inheritable=True)
+
+
+def record_search_usage(response) -> None:
+    """Count a grounded search made with the google genai client, which has no callbacks."""
+    handler = _usage_handler_var.get()
+    if handler is not None:
+        handler.add_search(response)
+
+
+def track_usage(node: Callable) -> Callable:
+    """Wrap a node so the model calls it makes are added to `run_usage`."""
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def atracked(state, config):
+            handler = _UsageHandler()
+            token = _usage_handler_var.set(handler)
+            try:
+                update = await node(state, config)
+            finally:
+                _usage_handler_var.reset(token)
+            return handler.add_to(update)
+
+        return atracked
+
+    @functools.wraps(node)
+    def tracked(state, config):
+        handler = _UsageHandler()
+        token = _usage_handler_var.set(handler)
+        try:
+            update = node(state, config)
+        finally:
+            _usage_handler_var.reset(token)
+        return handler.add_to(update)
+
+    return tracked
+
+
+def budget_exhausted(run_usage: Optional[RunUsage], configurable) -> Optional[str]:
+    """Return why the run budget is spent, `None` while the run is within it.
+
+    A limit of 0 is no limit.
+    """
+    if not run_usage:
+        return None
+    elapsed = time.time() - run_usage.get("started_at", time.time())
+    if configurable.run_max_seconds and elapsed >= configurable.run_max_seconds:
+        return f"{elapsed:.1f}s spent of {configurable.run_max_seconds}s"
+    limits = {
+        "llm_calls": configurable.run_max_llm_calls,
+        "input_tokens": configurable.run_max_input_tokens,
+        "output_tokens": configurable.run_max_output_tokens,
+    }
+    for counter, limit in limits.items():
+        if limit and run_usage.get(counter, 0) >= limit:
+            return f"{run_usage[counter]} {counter} spent of {limit}"
+    return None
@@ -0,0 +1,139 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from langchain_core.runnables import Runnable
+
+# The Gemini SDKs take about a second to import, they are imported with the
+# first client so that importing the graph stays fast.
+if TYPE_CHECKING:
+    from google.genai import Client
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+# Clients are expensive to build (credentials, gRPC/HTTP channel, TLS handshake)
+# and safe to share between threads, so every node gets them from here.
+_chat_models: dict[tuple, Runnable] = {}
+_genai_client: Optional["Client"] = None
+_lock = threading.Lock()
+_stats = {"hits": 0, "creations": 0}
+
+
+def _api_key() -> str:
+    api_key = os.getenv("GEMINI_API_KEY")
+    if api_key is None:
+        raise ValueError("GEMINI_API_KEY is not set")
+    return api_key
+
+
+def _create_chat_model(model: str, temperature: float, max_retries: int) -> "ChatGoogleGenerativeAI":
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        max_retries=max_retries,
+        api_key=_api_key(),
+    )
+
+
+def _create_genai_client() -> "Client":
+    from google.genai import Client
+
+    return Client(api_key=_api_key())
+
+
+_chat_model_factory: Callable[[str, float, int], Runnable] = _create_chat_model
+_genai_client_factory: Callable[[], Any] = _create_genai_client
+
+
+def get_chat_model(
+    model: str,
+    temperature: float,
+    schema: Optional[type] = None,
+    max_retries: int = 2,
+    method: Optional[str] = None,
+) -> Runnable:
+    """Return the shared chat model for a (model, temperature, schema) combination.
+
+    Structured variants wrap the plain model of the same model and temperature,
+    so they share its underlying connection.
+
+    Args:
+        model: Name of the Gemini model.
+        temperature: Sampling temperature.
+        schema: Pydantic model for structured output, `None` for plain messages.
+        max_retries: Number of retries of the underlying client.
+        method: Structured output method, e.g. "json_mode", which unlike the
+            default tool calling can be combined with cached content.
+    """
+    key = (model, temperature, schema, max_retries, method)
+    with _lock:
+        chat_model = _chat_models.get(key)
+        if chat_model is not None:
+            _stats["hits"] += 1
+            return chat_model
+
+        base_key = (model, temperature, None, max_retries, None)
+        base_model = _chat_models.get(base_key)
+        if base_model is None:
+            base_model = _chat_model_factory(model, temperature, max_retries)
+            _chat_models[base_key] = base_model
+            _stats["creations"] += 1
+        else:
+            _stats["hits"] += 1
+        if schema is None:
+            return base_model
+
+        if method is None:
+            chat_model = base_model.with_structured_output(schema)
+        else:
+            chat_model = base_model.with_structured_output(schema, method=method)
+        _chat_models[key] = chat_model
+        return chat_model
+
+
+def get_genai_client() -> "Client":
+    """Return the shared google-genai client used for grounded search."""
+    global _genai_client
+    with _lock:
+        if _genai_client is None:
+            _genai_client = _genai_client_factory()
+            _stats["creations"] += 1
+        else:
+            _stats["hits"] += 1
+        return _genai_client
+
+
+def get_client_stats() -> dict[str, Any]:
+    """Return the cache hits and client creations of the registry so far."""
+    with _lock:
+        return {**_stats, "cached_clients": len(_chat_models) + (_genai_client is not None)}
+
+
+def reset_clients() -> None:
+    """Drop every cached client and reset the counters."""
+    global _genai_client
+    with _lock:
+        _chat_models.clear()
+        _genai_client = None
+        _stats["hits"] = 0
+        _stats["creations"] = 0
+
+
+def set_client_factories(
+    chat_model_factory: Optional[Callable[[str, float, int], Runnable]] = None,
+    genai_client_factory: Optional[Callable[[], Any]] = None,
+) -> None:
+    """Build the clients with other factories, e.g. local stand-ins for benchmarks.
+
+    `None` restores the Gemini factory. The cached clients are dropped.
+
+    Args:
+        chat_model_factory: Called with (model, temperature, max_retries), returns a chat model.
+        genai_client_factory: Returns an object with the `models` / `aio.models` API of `genai.Client`.
+    """
+    global _chat_model_factory, _genai_client_factory
+    _chat_model_factory = chat_model_factory or _create_chat_model
+    _genai_client_factory = genai_client_factory or _create_genai_client
+    reset_clients()
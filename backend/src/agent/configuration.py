@@ -29,6 +29,38 @@ class Configuration(BaseModel):
         },
     )
 
+    model_routing: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to pick the model of the query, reflection and answer calls from the tier table, by the complexity of the request, instead of the models above."
+        },
+    )
+
+    light_model: str = Field(
+        default="gemini-2.5-flash-lite",
+        metadata={"description": "The model of the light routing tier."},
+    )
+
+    standard_model: str = Field(
+        default="gemini-2.5-flash",
+        metadata={"description": "The model of the standard routing tier."},
+    )
+
+    heavy_model: str = Field(
+        default="gemini-2.5-pro",
+        metadata={"description": "The model of the heavy routing tier."},
+    )
+
+    routing_light_max_score: float = Field(
+        default=0.25,
+        metadata={"description": "Highest complexity score (0 to 1) routed to the light tier."},
+    )
+
+    routing_heavy_min_score: float = Field(
+        default=0.6,
+        metadata={"description": "Lowest complexity score (0 to 1) routed to the heavy tier."},
+    )
+
     number_of_initial_queries: int = Field(
         default=3,
         metadata={"description": "The number of initial search queries to generate."},
@@ -39,6 +71,172 @@ class Configuration(BaseModel):
         metadata={"description": "The maximum number of research loops to perform."},
     )
 
+    min_research_gain: float = Field(
+        default=0.0,
+        metadata={
+            "description": "Minimum information gain (0 to 1) of a research loop, from its new sources and the novelty of its results, to run another loop. 0 disables early stopping."
+        },
+    )
+
+    intent_mode: str = Field(
+        default="sequential",
+        metadata={
+            "description": "How generate_query combines intent classification and query writing: 'sequential' (classify, then write queries), 'speculative' (run both concurrently, drop the queries when no research is needed; a dropped query call has usually started and is still paid for) or 'combined' (a single structured call returns both)."
+        },
+    )
+
+    query_similarity_threshold: float = Field(
+        default=0.8,
+        metadata={
+            "description": "Shingle Jaccard similarity from which a generated query is considered a duplicate of a query already searched in the run and is skipped. 1.0 only skips exact duplicates."
+        },
+    )
+
+    memory_search_limit: int = Field(
+        default=20,
+        metadata={
+            "description": "The maximum number of long-term memories injected into a prompt, ranked by relevance to the query. 0 injects all of them. Without a vector index on the store, every memory of the user is read (one store call per 1000 memories) and ranked lexically once per run."
+        },
+    )
+
+    memory_max_chars: int = Field(
+        default=4000,
+        metadata={
+            "description": "The character budget of the long-term memory block in a prompt. 0 disables the budget."
+        },
+    )
+
+    memory_duplicate_threshold: float = Field(
+        default=0.8,
+        metadata={
+            "description": "Word-level Jaccard similarity from which an extracted fact is considered a duplicate of an existing memory and is not stored."
+        },
+    )
+
+    search_cache: str = Field(
+        default="none",
+        metadata={
+            "description": "Cache of grounded web search results shared across runs: 'none', 'memory' (per worker process) or 'sqlite' (local file). Cached searches leave the user's memory out of the search prompt so results can be shared between users."
+        },
+    )
+
+    search_cache_path: str = Field(
+        default="search_cache.sqlite3",
+        metadata={"description": "The SQLite file of the 'sqlite' search cache."},
+    )
+
+    search_cache_ttl_seconds: int = Field(
+        default=86400,
+        metadata={
+            "description": "How long a cached search result stays valid, in seconds. 0 disables expiry."
+        },
+    )
+
+    search_cache_max_entries: int = Field(
+        default=10000,
+        metadata={
+            "description": "The maximum number of cached search results, the least recently used ones are evicted."
+        },
+    )
+
+    summaries_token_budget: int = Field(
+        default=32000,
+        metadata={
+            "description": "Estimated token budget of the web research summaries in the reflection and answer prompts. Over budget the newest summaries are kept and older ones are compressed. 0 disables the budget."
+        },
+    )
+
+    summaries_compression: str = Field(
+        default="truncate",
+        metadata={
+            "description": "How older web research summaries are compressed when over budget: 'truncate' or 'summarize' (condensed by the query generator model, cached)."
+        },
+    )
+
+    summaries_digest_tokens: int = Field(
+        default=256,
+        metadata={
+            "description": "Target size, in tokens, of a condensed web research summary."
+        },
+    )
+
+    research_topic_max_turns: int = Field(
+        default=0,
+        metadata={
+            "description": "Number of recent conversation turns kept verbatim in the research topic, older turns are summarized. 0 keeps the whole conversation."
+        },
+    )
+
+    stream_answer: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to stream the final answer token by token to the messages stream, with its short urls already rewritten."
+        },
+    )
+
+    run_max_seconds: float = Field(
+        default=0,
+        metadata={
+            "description": "Wall-clock budget of a run in seconds, 0 for no limit. Once spent the run stops researching, answers with budget_answer_model and skips memorize."
+        },
+    )
+
+    run_max_llm_calls: int = Field(
+        default=0,
+        metadata={
+            "description": "Budget of model calls (searches included) of a run, 0 for no limit."
+        },
+    )
+
+    run_max_input_tokens: int = Field(
+        default=0,
+        metadata={
+            "description": "Budget of input tokens of a run, 0 for no limit."
+        },
+    )
+
+    run_max_output_tokens: int = Field(
+        default=0,
+        metadata={
+            "description": "Budget of output tokens of a run, 0 for no limit."
+        },
+    )
+
+    budget_answer_model: str = Field(
+        default="gemini-2.5-flash",
+        metadata={
+            "description": "The name of the language model used for the answer once the run budget is spent."
+        },
+    )
+
+    prompt_cache: str = Field(
+        default="none",
+        metadata={
+            "description": "Explicit context caching of the static prompt instructions: 'none', 'gemini' (registered as cached content with the Gemini API) or 'local' (an in-process stand-in for tests and benchmarks)."
+        },
+    )
+
+    prompt_cache_ttl_seconds: int = Field(
+        default=3600,
+        metadata={
+            "description": "Lifetime of a cached prompt prefix, it is registered again once expired."
+        },
+    )
+
+    memorize_in_background: bool = Field(
+        default=False,
+        metadata={
+            "description": "Extract and store long-term memories in a background job after the answer is produced, instead of before the run ends. The thread's memorize mark only moves once a job succeeded, a failed job's turns are extracted again by the next memorize (at-least-once, duplicates are dropped)."
+        },
+    )
+
+    memorize_research: bool = Field(
+        default=False,
+        metadata={
+            "description": "Also send the web research results gathered since the last memorize to the memory extraction, not only the new messages."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -0,0 +1,200 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from src.agent.clients import get_chat_model
+from src.agent.prompts import research_digest_instructions
+
+
+# Rough size of a token for Gemini models, good enough for budgeting without
+# a token-counting round trip.
+CHARS_PER_TOKEN = 4
+
+# Digests of older research results, keyed by the result text and target size.
+# Results never change once written, so a loop only condenses the new ones.
+MAX_CACHED_DIGESTS = 2048
+_digests: OrderedDict[str, str] = OrderedDict()
+_digests_lock = threading.Lock()
+
+# A `[label](short_url)` citation marker, and the end of a sentence
+_MARKER_RE = re.compile(r"\[[^\[\]\n]*\]\([^()\s]*\)")
+_SENTENCE_END_RE = re.compile(r"[.!?](?=\s)")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens` at the last complete citation marker or sentence.
+
+    A cut through a marker would leave a partial short url the answer model
+    could copy and that can't be rewritten to its original url.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = max_chars
+    for marker in _MARKER_RE.finditer(text):
+        if marker.start() >= cut:
+            break
+        if marker.end() > cut:
+            cut = marker.start()
+            break
+    head = text[:cut]
+    boundaries = [match.end() for match in _MARKER_RE.finditer(head)]
+    boundaries += [match.end() for match in _SENTENCE_END_RE.finditer(head)]
+    boundary = max(boundaries, default=0)
+    # Without a boundary in the second half, keeping more text is worth more
+    if boundary >= cut // 2:
+        cut = boundary
+    return text[:cut].rstrip() + " [...]"
+
+
+def _digest_key(text: str, max_tokens: int) -> str:
+    return f"{max_tokens}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+
+def _cached_digest(key: str) -> Optional[str]:
+    with _digests_lock:
+        digest = _digests.get(key)
+        if digest is not None:
+            _digests.move_to_end(key)
+        return digest
+
+
+def _cache_digest(key: str, digest: str) -> None:
+    with _digests_lock:
+        _digests[key] = digest
+        _digests.move_to_end(key)
+        while len(_digests) > MAX_CACHED_DIGESTS:
+            _digests.popitem(last=False)
+
+
+def _split_by_budget(results: List[str], token_budget: int) -> tuple[List[str], List[str], int]:
+    """Keep the newest results verbatim while they fit in the budget.
+
+    Returns:
+        The older results to compress, the newest results kept verbatim and the
+        tokens left for the older ones.
+    """
+    remaining = token_budget
+    split = len(results)
+    for index in range(len(results) - 1, -1, -1):
+        size = estimate_tokens(results[index])
+        if size > remaining:
+            break
+        remaining -= size
+        split = index
+    return results[:split], results[split:], remaining
+
+
+def _digest_prompts(older: List[str], research_topic: str, max_tokens: int) -> dict[str, str]:
+    """Prompts for the older results that have no cached digest yet, by cache key."""
+    prompts = {}
+    for text in older:
+        key = _digest_key(text, max_tokens)
+        if key not in prompts and _cached_digest(key) is None:
+            prompts[key] = research_digest_instructions.format(
+                max_words=max_tokens * 3 // 4,
+                research_topic=research_topic,
+                summary=text,
+            )
+    return prompts
+
+
+def _assemble(
+    older: List[str],
+    newer: List[str],
+    remaining: int,
+    separator: str,
+    compression: str,
+    digest_tokens: int,
+) -> str:
+    compressed = []
+    if older and remaining > 0:
+        per_result = max(remaining // len(older), 1)
+        for text in older:
+            if compression == "summarize":
+                text = _cached_digest(_digest_key(text, digest_tokens)) or text
+            compressed.append(_truncate(text, per_result))
+    return separator.join(compressed + newer)
+
+
+def _needs_budget(results: List[str], token_budget: int) -> bool:
+    return bool(token_budget) and sum(estimate_tokens(text) for text in results) > token_budget
+
+
+def summaries_budget_options(configurable, research_topic: str) -> dict:
+    """Keyword arguments of `build_summaries_context` taken from the configuration."""
+    return {
+        "token_budget": configurable.summaries_token_budget,
+        "compression": configurable.summaries_compression,
+        "research_topic": research_topic,
+        "model": configurable.query_generator_model,
+        "digest_tokens": configurable.summaries_digest_tokens,
+    }
+
+
+def build_summaries_context(
+    results: List[str],
+    separator: str,
+    token_budget: int,
+    compression: str = "truncate",
+    research_topic: str = "",
+    model: str = "gemini-2.5-flash",
+    digest_tokens: int = 256,
+) -> str:
+    """Join the web research results into a prompt block that fits a token budget.
+
+    Under budget the results are joined unchanged. Over budget the newest results are
+    kept verbatim and the older ones share the tokens left: they are cut
+    (`compression="truncate"`) or first condensed by the model to about
+    `digest_tokens` tokens (`compression="summarize"`, digests are cached across
+    loops and runs so each result is condensed once).
+
+    Args:
+        results: The web research results, oldest first.
+        separator: The separator placed between results.
+        token_budget: Estimated token budget of the block, 0 disables budgeting.
+        compression: How older results are shrunk, "truncate" or "summarize".
+        research_topic: The research topic, used to condense older results.
+        model: The model condensing older results.
+        digest_tokens: Target size of a condensed result.
+    """
+    if not _needs_budget(results, token_budget):
+        return separator.join(results)
+
+    older, newer, remaining = _split_by_budget(results, token_budget)
+    if compression == "summarize" and older and remaining > 0:
+        prompts = _digest_prompts(older, research_topic, digest_tokens)
+        if prompts:
+            llm = get_chat_model(model, temperature=0)
+            for key, digest in zip(prompts, llm.batch(list(prompts.values()))):
+                _cache_digest(key, digest.content)
+    return _assemble(older, newer, remaining, separator, compression, digest_tokens)
+
+
+async def abuild_summaries_context(
+    results: List[str],
+    separator: str,
+    token_budget: int,
+    compression: str = "truncate",
+    research_topic: str = "",
+    model: str = "gemini-2.5-flash",
+    digest_tokens: int = 256,
+) -> str:
+    """Async version of `build_summaries_context`."""
+    if not _needs_budget(results, token_budget):
+        return separator.join(results)
+
+    older, newer, remaining = _split_by_budget(results, token_budget)
+    if compression == "summarize" and older and remaining > 0:
+        prompts = _digest_prompts(older, research_topic, digest_tokens)
+        if prompts:
+            llm = get_chat_model(model, temperature=0)
+            for key, digest in zip(prompts, await llm.abatch(list(prompts.values()))):
+                _cache_digest(key, digest.content)
+    return _assemble(older, newer, remaining, separator, compression, digest_tokens)
@@ -0,0 +1,62 @@
+import time
+from typing import Literal, TypedDict
+
+from langgraph.config import get_stream_writer
+
+
+# Length of the result preview sent with a progress event, the full result is
+# only sent with the node's state update.
+SUMMARY_PREVIEW_CHARS = 280
+
+
+class WebResearchEvent(TypedDict):
+    """Custom stream event sent by each `web_research` branch when it finishes.
+
+    Received with `stream_mode="custom"`, see the README for the schema.
+    """
+
+    event: Literal["web_research"]
+    id: int
+    query: str
+    summary: str
+    source_count: int
+    latency_ms: int
+    cached: bool
+
+
+def _preview(text: str) -> str:
+    text = " ".join(text.split())
+    if len(text) <= SUMMARY_PREVIEW_CHARS:
+        return text
+    return text[:SUMMARY_PREVIEW_CHARS].rstrip() + "..."
+
+
+def publish_web_research_event(
+    search_id: int,
+    query: str,
+    text: str,
+    source_ids: list,
+    started_at: float,
+    cached: bool,
+) -> WebResearchEvent:
+    """Send a `WebResearchEvent` to the custom stream, a no-op when it is not streamed.
+
+    Args:
+        search_id: The id of the fan-out branch.
+        query: The search query of the branch.
+        text: The grounded search result, without citation markers.
+        source_ids: The short ids of the sources cited by the result.
+        started_at: `time.perf_counter()` when the branch started.
+        cached: Whether the result came from the search cache.
+    """
+    event: WebResearchEvent = {
+        "event": "web_research",
+        "id": search_id,
+        "query": query,
+        "summary": _preview(text or ""),
+        "source_count": len(set(source_ids)),
+        "latency_ms": round((time.perf_counter() - started_at) * 1000),
+        "cached": cached,
+    }
+    get_stream_writer()(event)
+    return event
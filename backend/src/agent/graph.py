@@ -1,43 +1,64 @@
-import os
-
 from dotenv import load_dotenv
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
 
-from src.agent.nodes.memorize import memorize
+from src.agent.nodes.memorize import amemorize, memorize
+from src.agent.nodes.load_memory import aload_memory, load_memory
 from src.agent.nodes.continue_to_web_research import continue_to_web_research
 from src.agent.nodes.evaluate_research import evaluate_research
-from src.agent.nodes.finalize_answer import finalize_answer
-from src.agent.nodes.generate_query import generate_query
-from src.agent.nodes.reflection import reflection
-from src.agent.nodes.web_research import web_research
+from src.agent.nodes.finalize_answer import afinalize_answer, finalize_answer
+from src.agent.nodes.generate_query import agenerate_query, generate_query
+from src.agent.nodes.reflection import areflection, reflection
+from src.agent.nodes.web_research import aweb_research, web_research
 from src.agent.state import (
     OverallState,
+    WebSearchState,
 )
 from src.agent.configuration import Configuration
+from src.agent.budget import track_usage
+from src.agent.instrumentation import instrument_node
 
+# GEMINI_API_KEY is checked when the first client is built, not at import
 load_dotenv()
 
-if os.getenv("GEMINI_API_KEY") is None:
-    raise ValueError("GEMINI_API_KEY is not set")
+
+def with_async(node, anode):
+    """Wrap a node and its async version, `ainvoke`/`astream` run the async one.
+
+    Both record the model calls and tokens they spend in `run_usage`, and are
+    traced and timed when an exporter is installed.
+    """
+    name = node.__name__
+    return RunnableLambda(
+        track_usage(instrument_node(node, name)),
+        afunc=track_usage(instrument_node(anode, name)),
+        name=name,
+    )
 
 
 # Create our Agent Graph
 builder = StateGraph(OverallState, config_schema=Configuration)
 
 # Define the nodes we will cycle between
-builder.add_node("generate_query", generate_query)
-builder.add_node("web_research", web_research)
-builder.add_node("reflection", reflection)
-builder.add_node("finalize_answer", finalize_answer)
-builder.add_node("memorize", memorize)
-
-# Set the entrypoint as `generate_query`
-# This means that this node is the first one called
-builder.add_edge(START, "generate_query")
+builder.add_node("load_memory", with_async(load_memory, aload_memory))
+builder.add_node("generate_query", with_async(generate_query, agenerate_query))
+builder.add_node(
+    "web_research",
+    with_async(web_research, aweb_research),
+    input_schema=WebSearchState,
+)
+builder.add_node("reflection", with_async(reflection, areflection))
+builder.add_node("finalize_answer", with_async(finalize_answer, afinalize_answer))
+builder.add_node("memorize", with_async(memorize, amemorize))
+
+# Set the entrypoint as `load_memory`
+# This means that the long-term memory is read once, before `generate_query`
+builder.add_edge(START, "load_memory")
+builder.add_edge("load_memory", "generate_query")
 # Add conditional edge to continue with search queries in a parallel branch
 builder.add_conditional_edges(
-    "generate_query", continue_to_web_research, ["web_research"]
+    "generate_query", continue_to_web_research, ["web_research", "finalize_answer"]
 )
 # Reflect on the web research
 builder.add_edge("web_research", "reflection")
@@ -0,0 +1,205 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+# Both exporters are optional, the agent runs the same without them.
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+
+_tracer = trace.get_tracer("agent") if trace is not None else None
+
+if prometheus_client is not None:
+    NODE_DURATION = prometheus_client.Histogram(
+        "agent_node_duration_seconds", "Wall time of a graph node.", ["node"]
+    )
+    NODE_UPDATE_BYTES = prometheus_client.Histogram(
+        "agent_node_update_bytes",
+        "Size of the state update returned by a graph node.",
+        ["node"],
+        buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+    )
+    LLM_DURATION = prometheus_client.Histogram(
+        "agent_llm_duration_seconds", "Latency of a model call.", ["node", "model"]
+    )
+    LLM_TOKENS = prometheus_client.Counter(
+        "agent_llm_tokens_total", "Tokens of the model calls.", ["node", "model", "kind"]
+    )
+    STORE_DURATION = prometheus_client.Histogram(
+        "agent_store_duration_seconds", "Latency of a long-term memory store call.", ["operation"]
+    )
+    STORE_ERRORS = prometheus_client.Counter(
+        "agent_store_errors_total", "Failed long-term memory store calls.", ["operation"]
+    )
+    STORE_PAYLOAD_BYTES = prometheus_client.Histogram(
+        "agent_store_payload_bytes",
+        "Size of the memories written to the store in one call.",
+        ["operation"],
+        buckets=(256, 1024, 4096, 16384, 65536, 262144),
+    )
+
+
+def enabled() -> bool:
+    return prometheus_client is not None or _tracer is not None
+
+
+def _payload_size(payload: Any) -> int:
+    return len(json.dumps(payload, default=str))
+
+
+@contextmanager
+def _span(name: str, **attributes: Any) -> Iterator[Any]:
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as span:
+        yield span
+
+
+def instrument_node(node: Callable, name: str) -> Callable:
+    """Wrap a node with a span and its wall time and state update size metrics."""
+    if not enabled():
+        return node
+
+    def _record(started_at: float, update: Any) -> None:
+        if prometheus_client is None:
+            return
+        NODE_DURATION.labels(name).observe(time.perf_counter() - started_at)
+        if isinstance(update, dict):
+            NODE_UPDATE_BYTES.labels(name).observe(_payload_size(update))
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def ainstrumented(state, config):
+            started_at = time.perf_counter()
+            with _span(f"node {name}", node=name):
+                update = await node(state, config)
+            _record(started_at, update)
+            return update
+
+        return ainstrumented
+
+    @functools.wraps(node)
+    def instrumented(state, config):
+        started_at = time.perf_counter()
+        with _span(f"node {name}", node=name):
+            update = node(state, config)
+        _record(started_at, update)
+        return update
+
+    return instrumented
+
+
+@contextmanager
+def observe_store_call(operation: str, payload: Any = None) -> Iterator[None]:
+    """Time a long-term memory store call, `payload` is the data it writes."""
+    if not enabled():
+        yield
+        return
+    started_at = time.perf_counter()
+    with _span(f"store {operation}", operation=operation):
+        try:
+            yield
+        except Exception:
+            if prometheus_client is not None:
+                STORE_ERRORS.labels(operation).inc()
+            raise
+    if prometheus_client is not None:
+        STORE_DURATION.labels(operation).observe(time.perf_counter() - started_at)
+        if payload is not None:
+            STORE_PAYLOAD_BYTES.labels(operation).observe(_payload_size(payload))
+
+
+def record_search_call(model: str, started_at: float, response) -> None:
+    """Record a grounded search made with the google genai client, which has no callbacks."""
+    if prometheus_client is None:
+        return
+    usage_metadata = getattr(response, "usage_metadata", None)
+    LLM_DURATION.labels("web_research", model).observe(time.perf_counter() - started_at)
+    LLM_TOKENS.labels("web_research", model, "input_tokens").inc(
+        getattr(usage_metadata, "prompt_token_count", None) or 0
+    )
+    LLM_TOKENS.labels("web_research", model, "output_tokens").inc(
+        getattr(usage_metadata, "candidates_token_count", None) or 0
+    )
+    LLM_TOKENS.labels("web_research", model, "cached_input_tokens").inc(
+        getattr(usage_metadata, "cached_content_token_count", None) or 0
+    )
+
+
+class _ModelCallHandler(BaseCallbackHandler):
+    """Records the latency and tokens of every chat model call, with the node making it."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._runs: dict[UUID, tuple[float, str, str, Any]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "")
+        model = (metadata or {}).get("ls_model_name", "")
+        span = None
+        if _tracer is not None:
+            span = _tracer.start_span(f"llm {model}", attributes={"node": node, "model": model})
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), node, model, span)
+
+    def _finish(self, run_id: UUID, response: Optional[LLMResult]) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started_at, node, model, span = run
+        usage_metadata = {}
+        if response is not None and response.generations and response.generations[0]:
+            generation = response.generations[0][0]
+            if isinstance(generation, ChatGeneration):
+                usage_metadata = getattr(generation.message, "usage_metadata", None) or {}
+        cached_tokens = (usage_metadata.get("input_token_details") or {}).get("cache_read", 0)
+        if prometheus_client is not None:
+            LLM_DURATION.labels(node, model).observe(time.perf_counter() - started_at)
+            for kind in ("input_tokens", "output_tokens"):
+                LLM_TOKENS.labels(node, model, kind).inc(usage_metadata.get(kind, 0))
+            LLM_TOKENS.labels(node, model, "cached_input_tokens").inc(cached_tokens)
+        if span is not None:
+            span.set_attribute("input_tokens", usage_metadata.get("input_tokens", 0))
+            span.set_attribute("output_tokens", usage_metadata.get("output_tokens", 0))
+            span.set_attribute("cached_input_tokens", cached_tokens)
+            span.end()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, response)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, None)
+
+
+# Attached to every callback manager of the process while an exporter is installed
+_model_call_handler_var: ContextVar[Optional[_ModelCallHandler]] = ContextVar(
+    "model_call_handler", default=_ModelCallHandler() if enabled() else None
+)
+register_configure_hook(_model_call_handler_var, inheritable=True)
+
+
+def metrics_payload() -> Optional[tuple[bytes, str]]:
+    """Return the Prometheus exposition and its content type, `None` without prometheus_client."""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
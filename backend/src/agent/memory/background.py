@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Memory extraction is one LLM call plus a couple of store round trips, a
+# small pool is enough and keeps the store load of deferred writes bounded.
+MAX_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="memorize"
+            )
+        return _executor
+
+
+def _run_with_retry(
+    job: Callable[..., Any],
+    args: tuple,
+    retries: int,
+    backoff_seconds: float,
+) -> Any:
+    for attempt in range(retries + 1):
+        try:
+            return job(*args)
+        except Exception:
+            if attempt == retries:
+                logger.exception(
+                    "Memory job %s failed after %s attempts",
+                    job.__name__,
+                    attempt + 1,
+                    extra={"job": job.__name__, "attempts": attempt + 1},
+                )
+                raise
+            time.sleep(backoff_seconds * 2 ** attempt)
+
+
+def submit_memory_job(
+    job: Callable[..., Any],
+    *args: Any,
+    retries: int = 2,
+    backoff_seconds: float = 1.0,
+) -> Future:
+    """Run a memory job off the graph's critical path.
+
+    The job is retried with exponential backoff. Jobs run outside the graph
+    context, so they must receive the store explicitly instead of relying on
+    `get_store()`.
+
+    Returns:
+        The future of the job, mostly useful to wait for it in scripts.
+    """
+    return _get_executor().submit(_run_with_retry, job, args, retries, backoff_seconds)
@@ -0,0 +1,255 @@
+"""Consolidate the long-term memory of every user.
+
+    python -m src.agent.memory.consolidation --max-memories 500 --max-age-days 180
+
+`memorize` only ever adds memories. This job clusters the near-duplicate
+memories of each user and merges every cluster into one memory, then evicts the
+oldest memories over the per-user cap or older than the maximum age. It reports
+the number and size of the memories of each user before and after. Run it from
+cron, or keep it running with `--interval-seconds`.
+
+Eviction is by age, not by use: reads of the memory are not tracked. The age of
+a memory is the time since it was last written. A merged memory keeps the latest
+write time of its cluster in `last_written_at`, so merging doesn't make it new.
+"""
+import argparse
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from langgraph.store.base import BaseStore, Item, PutOp
+
+from src.agent.instrumentation import observe_store_call
+from src.agent.utils import jaccard_similarity, text_tokens
+
+
+NAMESPACE = "long-term-memory"
+PAGE_SIZE = 500
+
+
+@dataclass
+class UserConsolidation:
+    user_id: str
+    before: int = 0
+    after: int = 0
+    before_chars: int = 0
+    after_chars: int = 0
+    merged: int = 0
+    evicted: int = 0
+
+
+def _content(item: Item) -> str:
+    return str(item.value.get("content", ""))
+
+
+def _last_written(item: Item) -> datetime:
+    last_written_at = item.value.get("last_written_at")
+    return datetime.fromisoformat(last_written_at) if last_written_at else item.updated_at
+
+
+def list_memory_users(store: BaseStore, namespace: str = NAMESPACE) -> list[str]:
+    """The ids of the users that have memories in `namespace`."""
+    users, offset = [], 0
+    while True:
+        with observe_store_call("list_namespaces"):
+            namespaces = store.list_namespaces(
+                prefix=(namespace,), max_depth=2, limit=PAGE_SIZE, offset=offset
+            )
+        users += [user_namespace[1] for user_namespace in namespaces if len(user_namespace) == 2]
+        if len(namespaces) < PAGE_SIZE:
+            return users
+        offset += PAGE_SIZE
+
+
+def _load_memories(store: BaseStore, user_id: str, namespace: str) -> list[Item]:
+    items, offset = [], 0
+    while True:
+        with observe_store_call("search"):
+            page = store.search((namespace, user_id), limit=PAGE_SIZE, offset=offset)
+        items += page
+        if len(page) < PAGE_SIZE:
+            return items
+        offset += PAGE_SIZE
+
+
+def cluster_memories(items: list[Item], threshold: float) -> list[list[Item]]:
+    """Group near-duplicate memories, the most recently written first in every cluster.
+
+    A memory joins the first cluster whose first memory has a word-level Jaccard
+    similarity of at least `threshold` with it, the same test `memorize` uses
+    to skip duplicates.
+    """
+    clusters: list[tuple[set[str], list[Item]]] = []
+    for item in sorted(items, key=_last_written, reverse=True):
+        tokens = text_tokens(_content(item))
+        for representative_tokens, members in clusters:
+            if jaccard_similarity(tokens, representative_tokens) >= threshold:
+                members.append(item)
+                break
+        else:
+            clusters.append((tokens, [item]))
+    return [members for _, members in clusters]
+
+
+def _most_complete(cluster: list[Item]) -> Item:
+    # The statement with the most distinct words, the most recently written on ties
+    return max(cluster, key=lambda item: len(text_tokens(_content(item))))
+
+
+def _merge_with_model(clusters: list[list[Item]], model: str) -> list[Optional[str]]:
+    from src.agent.clients import get_chat_model
+    from src.agent.prompts import memory_merge_instructions
+
+    prompts = [
+        memory_merge_instructions.format(memories="\n".join(f"- {_content(item)}" for item in cluster))
+        for cluster in clusters
+    ]
+    results = get_chat_model(model, temperature=0).batch(prompts, return_exceptions=True)
+    # A failed merge falls back to the most complete statement
+    return [None if isinstance(result, Exception) else str(result.content).strip() or None for result in results]
+
+
+def _merged_value(cluster: list[Item], content: Optional[str]) -> tuple[str, dict[str, Any]]:
+    survivor = _most_complete(cluster)
+    return survivor.key, {
+        **survivor.value,
+        "content": content or _content(survivor),
+        "last_written_at": max(_last_written(item) for item in cluster).isoformat(),
+        "merged_count": sum(item.value.get("merged_count", 1) for item in cluster),
+    }
+
+
+def consolidate_user(
+    store: BaseStore,
+    user_id: str,
+    namespace: str = NAMESPACE,
+    threshold: float = 0.8,
+    max_memories: int = 0,
+    max_age_days: float = 0,
+    merge_model: Optional[str] = None,
+    dry_run: bool = False,
+) -> UserConsolidation:
+    """Merge the near-duplicate memories of a user and evict the stale ones.
+
+    Args:
+        store: The long-term memory store.
+        user_id: Owner of the memories.
+        namespace: First element of the store namespace.
+        threshold: Jaccard similarity from which two memories are merged.
+        max_memories: Memories kept per user, the oldest are evicted. 0 for no cap.
+        max_age_days: Memories not written for longer are evicted. 0 for no limit.
+        merge_model: Model rewriting each cluster into one memory, `None` keeps
+            the most complete memory of the cluster.
+        dry_run: Report what would change without writing to the store.
+    """
+    items = _load_memories(store, user_id, namespace)
+    report = UserConsolidation(
+        user_id=user_id, before=len(items), before_chars=sum(len(_content(item)) for item in items)
+    )
+
+    clusters = cluster_memories(items, threshold)
+    duplicates = [cluster for cluster in clusters if len(cluster) > 1]
+    contents = _merge_with_model(duplicates, merge_model) if merge_model and duplicates else [None] * len(duplicates)
+    merged = dict(_merged_value(cluster, content) for cluster, content in zip(duplicates, contents))
+    survivors = {cluster[0].key: cluster[0].value for cluster in clusters if len(cluster) == 1}
+    survivors.update(merged)
+    report.merged = len(items) - len(survivors)
+
+    last_written = {item.key: _last_written(item) for item in items}
+    last_written.update(
+        {key: datetime.fromisoformat(value["last_written_at"]) for key, value in merged.items()}
+    )
+    # Most recently written first, the tail is evicted
+    ranked = sorted(survivors, key=last_written.__getitem__, reverse=True)
+    if max_age_days:
+        oldest = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        ranked = [key for key in ranked if last_written[key] >= oldest]
+    if max_memories:
+        ranked = ranked[:max_memories]
+    report.evicted = len(survivors) - len(ranked)
+
+    kept = set(ranked)
+    report.after = len(kept)
+    report.after_chars = sum(len(str(survivors[key].get("content", ""))) for key in kept)
+    operations = [PutOp((namespace, user_id), key, merged[key]) for key in merged if key in kept]
+    operations += [PutOp((namespace, user_id), item.key, None) for item in items if item.key not in kept]
+    if operations and not dry_run:
+        # One round trip per user, deletes are puts of None
+        with observe_store_call("consolidate"):
+            store.batch(operations)
+    return report
+
+
+def consolidate_memories(
+    store: BaseStore,
+    user_ids: Optional[list[str]] = None,
+    namespace: str = NAMESPACE,
+    **options: Any,
+) -> list[UserConsolidation]:
+    """Consolidate the memories of the given users, every user by default.
+
+    `options` are the keyword arguments of `consolidate_user`.
+    """
+    if user_ids is None:
+        user_ids = list_memory_users(store, namespace)
+    return [consolidate_user(store, user_id, namespace, **options) for user_id in user_ids]
+
+
+def _print_reports(reports: list[UserConsolidation]) -> None:
+    # The report is the output of the command line job
+    for report in reports:
+        print(  # noqa: T201
+            f"user {report.user_id}: {report.before} -> {report.after} memories "
+            f"({report.before_chars} -> {report.after_chars} chars), "
+            f"{report.merged} merged, {report.evicted} evicted"
+        )
+    print(  # noqa: T201
+        f"{len(reports)} users: {sum(report.before for report in reports)} -> "
+        f"{sum(report.after for report in reports)} memories"
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Consolidate the long-term memory store from the command line."""
+    parser = argparse.ArgumentParser(description="Merge duplicate long-term memories and evict the oldest ones")
+    parser.add_argument("--postgres-uri", default=os.getenv("POSTGRES_URI"),
+                        help="Postgres store of the memories, POSTGRES_URI by default")
+    parser.add_argument("--user", action="append", dest="user_ids", help="Only this user, repeatable")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Jaccard similarity of duplicates")
+    parser.add_argument("--max-memories", type=int, default=500, help="Memories kept per user, the oldest are evicted, 0 for no cap")
+    parser.add_argument("--max-age-days", type=float, default=0, help="Evict memories not written for longer, 0 to keep")
+    parser.add_argument("--merge-model", help="Model merging the duplicates, keeps the most complete one otherwise")
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing to the store")
+    parser.add_argument("--interval-seconds", type=float, default=0, help="Run again every N seconds, 0 to run once")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    args = parser.parse_args(argv)
+    if not args.postgres_uri:
+        parser.error("--postgres-uri or POSTGRES_URI is required")
+
+    from langgraph.store.postgres import PostgresStore
+
+    with PostgresStore.from_conn_string(args.postgres_uri) as store:
+        while True:
+            reports = consolidate_memories(
+                store,
+                args.user_ids,
+                threshold=args.threshold,
+                max_memories=args.max_memories,
+                max_age_days=args.max_age_days,
+                merge_model=args.merge_model,
+                dry_run=args.dry_run,
+            )
+            if args.json:
+                print(json.dumps([asdict(report) for report in reports]))  # noqa: T201
+            else:
+                _print_reports(reports)
+            if not args.interval_seconds:
+                return
+            time.sleep(args.interval_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
 import os
 import uuid
-from typing import Any
+from typing import Any, Optional
+from langgraph.store.base import BaseStore, PutOp
 from langgraph.store.memory import InMemoryStore
-from langmem import create_manage_memory_tool, create_search_memory_tool
 from langgraph.config import get_store
 
+from src.agent.utils import jaccard_similarity, lexical_overlap, text_tokens
+from src.agent.instrumentation import observe_store_call
+
+
+# How many candidates to keep in the snapshot per requested result, later
+# nodes rank them again against their own query.
+CANDIDATE_POOL_FACTOR = 4
+
+# Page size of the full scan of a user's memories when the store has no vector index.
+SCAN_PAGE_SIZE = 1000
+
 
 def get_memory_tools(lang_graph_user_id):
+    # langmem is only needed by the memory tools, not by the graph
+    from langmem import create_manage_memory_tool, create_search_memory_tool
+
     manage_memory_tool = create_manage_memory_tool(
         namespace=("email_assistant", lang_graph_user_id, "collection")
     )
@@ -18,17 +32,232 @@ def get_memory_tools(lang_graph_user_id):
 
 def add_to_memory(key:str, content: dict[str, Any], lang_graph_user_id: str, namespace: str = "memory"):
     store = get_store()
-    store.put((namespace, lang_graph_user_id), key, content)
+    with observe_store_call("put", content):
+        store.put((namespace, lang_graph_user_id), key, content)
+
+def add_many_to_memory(
+    items: list[tuple[str, dict[str, Any]]],
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    store: Optional[BaseStore] = None,
+):
+    """Write several memories with a single store round trip.
+
+    `store` defaults to the store of the running graph; pass it explicitly
+    when writing from outside a node, e.g. from a background job.
+    """
+    if not items:
+        return
+    store = store if store is not None else get_store()
+    with observe_store_call("batch_put", items):
+        store.batch([
+            PutOp((namespace, lang_graph_user_id), key, content)
+            for key, content in items
+        ])
+
+async def aadd_many_to_memory(
+    items: list[tuple[str, dict[str, Any]]],
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    store: Optional[BaseStore] = None,
+):
+    """Async version of `add_many_to_memory`."""
+    if not items:
+        return
+    store = store if store is not None else get_store()
+    with observe_store_call("batch_put", items):
+        await store.abatch([
+            PutOp((namespace, lang_graph_user_id), key, content)
+            for key, content in items
+        ])
 
 def remove_from_memory(key: str, lang_graph_user_id: str, namespace: str = "memory"):
     store = get_store()
-    store.delete((namespace, lang_graph_user_id), key)
+    with observe_store_call("delete"):
+        store.delete((namespace, lang_graph_user_id), key)
 
-def search_in_memory(query: str, lang_graph_user_id: str, namespace: str = "memory"):
-    store = get_store()
-    results_of_search = store.search((namespace, lang_graph_user_id), limit=999999)
+def to_memory_record(item) -> dict[str, Any]:
+    """Reduce a store item to the plain dict kept in state and used in prompts."""
+    return {"key": item.key, "content": item.value['content'], "score": item.score}
+
+def rank_memory_items(query: str, items: list[dict[str, Any]], limit: Optional[int] = None) -> list[dict[str, Any]]:
+    """Order memory records by relevance to the query and keep the top `limit`.
+
+    Records scored by the store (vector index configured) keep the store order.
+    Unscored records are ranked by lexical overlap with the query; ties keep the
+    store order, so an empty query leaves the records untouched.
+    """
+    if query and any(item["score"] is None for item in items):
+        query_tokens = text_tokens(query)
+        items = sorted(
+            items,
+            key=lambda item: lexical_overlap(query_tokens, item["content"]),
+            reverse=True,
+        )
+    return items[:limit] if limit else items
+
+def format_memory_items(items: list[dict[str, Any]], max_chars: Optional[int] = None) -> str:
+    """Render memory records as prompt lines, stopping once `max_chars` is reached."""
     memory_items = []
-    for item in results_of_search:
-        memory_items.append(' - Memory (' + item.key + '): ' + item.value['content'])
+    used_chars = 0
+    for item in items:
+        line = ' - Memory (' + item["key"] + '): ' + item["content"]
+        if max_chars and used_chars + len(line) > max_chars:
+            break
+        memory_items.append(line)
+        used_chars += len(line) + 1
 
     return '\n'.join(memory_items)
+
+def select_new_memories(facts: list[str], existing: list[dict[str, Any]], threshold: float) -> list[str]:
+    """Drop facts that are near-duplicates of a stored memory or of an earlier fact.
+
+    Two texts are near-duplicates when the Jaccard similarity of their word
+    tokens is at least `threshold`.
+    """
+    seen_tokens = [text_tokens(item["content"]) for item in existing]
+    new_facts = []
+    for fact in facts:
+        fact_tokens = text_tokens(fact)
+        if any(jaccard_similarity(fact_tokens, tokens) >= threshold for tokens in seen_tokens):
+            continue
+        seen_tokens.append(fact_tokens)
+        new_facts.append(fact)
+
+    return new_facts
+
+def _has_vector_index(store: BaseStore) -> bool:
+    return getattr(store, "index_config", None) is not None
+
+def _candidate_pool(query: str, records: list[dict[str, Any]], limit: Optional[int]) -> list[dict[str, Any]]:
+    # Same pool size as a vector search would return, ranked over every memory
+    return rank_memory_items(query, records, limit * CANDIDATE_POOL_FACTOR if query and limit else limit)
+
+def _scan_memories(store: BaseStore, namespace: tuple[str, ...]) -> list[Any]:
+    items, offset = [], 0
+    while True:
+        with observe_store_call("search"):
+            page = store.search(namespace, limit=SCAN_PAGE_SIZE, offset=offset)
+        items += page
+        if len(page) < SCAN_PAGE_SIZE:
+            return items
+        offset += SCAN_PAGE_SIZE
+
+async def _ascan_memories(store: BaseStore, namespace: tuple[str, ...]) -> list[Any]:
+    items, offset = [], 0
+    while True:
+        with observe_store_call("search"):
+            page = await store.asearch(namespace, limit=SCAN_PAGE_SIZE, offset=offset)
+        items += page
+        if len(page) < SCAN_PAGE_SIZE:
+            return items
+        offset += SCAN_PAGE_SIZE
+
+def load_memory_snapshot(
+    query: str,
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    limit: Optional[int] = None,
+    store: Optional[BaseStore] = None,
+) -> list[dict[str, Any]]:
+    """Read the memory records a run may need.
+
+    With a `limit` only the candidate pool used for ranking is kept. A store
+    with a vector index returns the pool in a single semantic search. Without
+    one the store cannot rank by `query`, so every memory of the user is read,
+    page by page, and the pool is ranked lexically in-process.
+    """
+    store = store if store is not None else get_store()
+    if query and limit and _has_vector_index(store):
+        with observe_store_call("search"):
+            results_of_search = store.search(
+                (namespace, lang_graph_user_id), query=query, limit=limit * CANDIDATE_POOL_FACTOR
+            )
+        return [to_memory_record(item) for item in results_of_search]
+    records = [to_memory_record(item) for item in _scan_memories(store, (namespace, lang_graph_user_id))]
+    return _candidate_pool(query, records, limit)
+
+async def aload_memory_snapshot(
+    query: str,
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    limit: Optional[int] = None,
+    store: Optional[BaseStore] = None,
+) -> list[dict[str, Any]]:
+    """Async version of `load_memory_snapshot`."""
+    store = store if store is not None else get_store()
+    if query and limit and _has_vector_index(store):
+        with observe_store_call("search"):
+            results_of_search = await store.asearch(
+                (namespace, lang_graph_user_id), query=query, limit=limit * CANDIDATE_POOL_FACTOR
+            )
+        return [to_memory_record(item) for item in results_of_search]
+    records = [to_memory_record(item) for item in await _ascan_memories(store, (namespace, lang_graph_user_id))]
+    return _candidate_pool(query, records, limit)
+
+def search_in_memory(
+    query: str,
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    limit: Optional[int] = None,
+    max_chars: Optional[int] = None,
+):
+    """Return the memories most relevant to `query`, formatted for a prompt.
+
+    Args:
+        query: Text the memories are ranked against, empty to keep the store order.
+        lang_graph_user_id: Owner of the memories.
+        namespace: First element of the store namespace.
+        limit: Maximum number of memories to return, `None` or 0 for all of them.
+        max_chars: Character budget of the rendered block, `None` or 0 for no budget.
+    """
+    records = load_memory_snapshot(query, lang_graph_user_id, namespace, limit)
+    ranked = rank_memory_items(query, records, limit)
+
+    return format_memory_items(ranked, max_chars)
+
+async def asearch_in_memory(
+    query: str,
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    limit: Optional[int] = None,
+    max_chars: Optional[int] = None,
+):
+    """Async version of `search_in_memory`."""
+    records = await aload_memory_snapshot(query, lang_graph_user_id, namespace, limit)
+    ranked = rank_memory_items(query, records, limit)
+
+    return format_memory_items(ranked, max_chars)
+
+def recall_memory(
+    snapshot: Optional[list[dict[str, Any]]],
+    query: str,
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    limit: Optional[int] = None,
+    max_chars: Optional[int] = None,
+):
+    """Like `search_in_memory`, but served from the run's memory snapshot.
+
+    Falls back to the store when no snapshot was loaded or it was invalidated.
+    """
+    if snapshot is None:
+        return search_in_memory(query, lang_graph_user_id, namespace, limit, max_chars)
+    ranked = rank_memory_items(query, snapshot, limit)
+
+    return format_memory_items(ranked, max_chars)
+
+async def arecall_memory(
+    snapshot: Optional[list[dict[str, Any]]],
+    query: str,
+    lang_graph_user_id: str,
+    namespace: str = "memory",
+    limit: Optional[int] = None,
+    max_chars: Optional[int] = None,
+):
+    """Async version of `recall_memory`."""
+    if snapshot is None:
+        return await asearch_in_memory(query, lang_graph_user_id, namespace, limit, max_chars)
+    ranked = rank_memory_items(query, snapshot, limit)
+
+    return format_memory_items(ranked, max_chars)
@@ -1,43 +1,39 @@
-import os
+import logging
 
-from src.agent.tools_and_schemas import SearchQueryList, Reflection
-from dotenv import load_dotenv
-from langchain_core.messages import AIMessage
 from langgraph.types import Send
-from langgraph.graph import StateGraph
-from langgraph.graph import START, END
 from langchain_core.runnables import RunnableConfig
-from google.genai import Client
 
 from src.agent.state import (
-    OverallState,
     QueryGenerationState,
-    ReflectionState,
-    WebSearchState,
 )
 from src.agent.configuration import Configuration
-from src.agent.prompts import (
-    get_current_date,
-    query_writer_instructions,
-    web_searcher_instructions,
-    reflection_instructions,
-    answer_instructions,
-)
-from langchain_google_genai import ChatGoogleGenerativeAI
-from src.agent.utils import (
-    get_citations,
-    get_research_topic,
-    insert_citation_markers,
-    resolve_urls,
-)
+from src.agent.budget import budget_exhausted
+
+
+logger = logging.getLogger(__name__)
 
 
-def continue_to_web_research(state: QueryGenerationState):
+def continue_to_web_research(state: QueryGenerationState, config: RunnableConfig):
     """LangGraph node that sends the search queries to the web research node.
 
     This is used to spawn n number of web research nodes, one for each search query.
+    When no query was generated, or the run budget is already spent, the message is
+    answered directly.
     """
+    if not state.get("query_list"):
+        return "finalize_answer"
+    exhausted = budget_exhausted(state.get("run_usage"), Configuration.from_runnable_config(config))
+    if exhausted:
+        logger.info("Run budget spent (%s), skipping web research", exhausted, extra={"exhausted": exhausted})
+        return "finalize_answer"
     return [
-        Send("web_research", {"search_query": search_query, "id": int(idx)})
-        for idx, search_query in enumerate(state["search_query"])
+        Send(
+            "web_research",
+            {
+                "search_query": search_query,
+                "id": int(idx),
+                "memory_snapshot": state.get("memory_snapshot"),
+            },
+        )
+        for idx, search_query in enumerate(state["query_list"])
     ]
@@ -6,6 +6,7 @@ from src.agent.state import (
     ReflectionState,
 )
 from src.agent.configuration import Configuration
+from src.agent.budget import budget_exhausted
 
 
 def evaluate_research(
@@ -15,7 +16,8 @@ def evaluate_research(
     """LangGraph routing function that determines the next step in the research flow.
 
     Controls the research loop by deciding whether to continue gathering information
-    or to finalize the summary based on the configured maximum number of research loops.
+    or to finalize the summary based on the configured maximum number of research loops,
+    the information gain of the last loop and the run budget.
 
     Args:
         state: Current graph state containing the research loop count
@@ -30,7 +32,16 @@ def evaluate_research(
         if state.get("max_research_loops") is not None
         else configurable.max_research_loops
     )
-    if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
+    research_gain = state.get("research_gain") or []
+    if (
+        state["is_sufficient"]
+        or state["research_loop_count"] >= max_research_loops
+        # the last loop brought too little new information to pay for another one
+        or (research_gain and research_gain[-1]["gain"] < configurable.min_research_gain)
+        or budget_exhausted(state.get("run_usage"), configurable)
+        # every follow-up query was a duplicate of an earlier search
+        or not state["follow_up_queries"]
+    ):
         return "finalize_answer"
     else:
         return [
@@ -39,6 +50,7 @@ def evaluate_research(
                 {
                     "search_query": follow_up_query,
                     "id": state["number_of_ran_queries"] + int(idx),
+                    "memory_snapshot": state.get("memory_snapshot"),
                 },
             )
             for idx, follow_up_query in enumerate(state["follow_up_queries"])
@@ -1,7 +1,10 @@
-import os
+import logging
+import uuid
 
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, AIMessageChunk
 from langchain_core.runnables import RunnableConfig
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.graph.message import push_message
 
 from src.agent.state import (
     OverallState,
@@ -9,14 +12,88 @@ from src.agent.state import (
 from src.agent.configuration import Configuration
 from src.agent.prompts import (
     get_current_date,
-    answer_instructions,
+    answer_context,
+    answer_static,
+)
+from src.agent.clients import get_chat_model
+from src.agent.context import (
+    abuild_summaries_context,
+    build_summaries_context,
+    summaries_budget_options,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
 from src.agent.utils import (
+    aget_research_topic,
     get_research_topic,
+    replace_short_urls,
+    ShortUrlRewriter,
 )
-from src.agent.memory.tools import get_memory_tools
-from src.agent.memory.tools import search_in_memory
+from src.agent.memory.tools import arecall_memory, recall_memory
+from src.agent.budget import budget_exhausted
+from src.agent.routing import route_model
+from src.agent.prompt_cache import acached_prompt, cached_prompt
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARIES_SEPARATOR = "\n---\n\n"
+
+
+def _format_answer_context(research_topic: str, summaries: str, memory_items: str) -> str:
+    # Format the prompt
+    current_date = get_current_date()
+    return answer_context.format(
+        current_date=current_date,
+        research_topic=research_topic,
+        summaries=summaries,
+        memory=memory_items
+    )
+
+
+def _answer_update(state: OverallState, result) -> OverallState:
+    # Replace the short urls with the original urls and add all used urls to the sources_gathered
+    content, unique_sources = replace_short_urls(result.content, state.get("source_registry") or {})
+
+    return {
+        "messages": [AIMessage(content=content)],
+        "sources_gathered": unique_sources,
+    }
+
+
+def _answer_model(state: OverallState, configurable: Configuration) -> str:
+    exhausted = budget_exhausted(state.get("run_usage"), configurable)
+    if exhausted:
+        logger.info(
+            "Run budget spent (%s), answering with %s",
+            exhausted,
+            configurable.budget_answer_model,
+            extra={"exhausted": exhausted, "model": configurable.budget_answer_model},
+        )
+        return configurable.budget_answer_model
+    # An explicit reasoning_model stays the ceiling of the routing
+    return route_model(
+        "finalize_answer",
+        state,
+        configurable,
+        state.get("reasoning_model") or configurable.answer_model,
+        research=bool(state.get("query_list")),
+        heavy_model=state.get("reasoning_model"),
+    )
+
+
+def _push_answer_chunk(message_id: str, text: str) -> None:
+    # Sent to the messages stream only, the full answer is written to state at the end
+    if text:
+        push_message(AIMessageChunk(content=text, id=message_id), state_key=None)
+
+
+def _streamed_answer_update(message_id: str, parts: list[str], rewriter: ShortUrlRewriter) -> OverallState:
+    parts.append(rewriter.flush())
+    _push_answer_chunk(message_id, parts[-1])
+    return {
+        # Same id as the streamed chunks, so the stream doesn't send the answer twice
+        "messages": [AIMessage(content="".join(parts), id=message_id)],
+        "sources_gathered": rewriter.used_sources(),
+    }
 
 
 def finalize_answer(state: OverallState, config: RunnableConfig):
@@ -33,40 +110,90 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
         Dictionary with state update, including running_summary key containing the formatted final summary with sources
     """
     configurable = Configuration.from_runnable_config(config)
-    reasoning_model = state.get("reasoning_model") or configurable.answer_model
+    reasoning_model = _answer_model(state, configurable)
 
     user_id = "0" if state.get("user_id") is None else state.get("user_id")
-    memory_items = search_in_memory('', user_id,  "long-term-memory")
+    research_topic = get_research_topic(
+        state["messages"],
+        configurable.research_topic_max_turns,
+        configurable.query_generator_model,
+    )
+    memory_items = recall_memory(
+        state.get("memory_snapshot"),
+        research_topic,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+        max_chars=configurable.memory_max_chars,
+    )
 
-    # Format the prompt
-    current_date = get_current_date()
-    formatted_prompt = answer_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n---\n\n".join(state["web_research_result"]),
-        memory=memory_items
+    # init Reasoning Model, default to Gemini 2.5 Flash
+    llm = get_chat_model(reasoning_model, temperature=0)
+    summaries = build_summaries_context(
+        state["web_research_result"],
+        SUMMARIES_SEPARATOR,
+        **summaries_budget_options(configurable, research_topic),
+    )
+    prompt, cache_kwargs = cached_prompt(
+        answer_static,
+        _format_answer_context(research_topic, summaries, memory_items),
+        reasoning_model,
+        configurable,
     )
+    if not configurable.stream_answer:
+        result = llm.invoke(prompt, **cache_kwargs)
+        return _answer_update(state, result)
 
+    # The raw tokens still hold short urls, stream the rewritten text instead
+    rewriter = ShortUrlRewriter(state.get("source_registry") or {})
+    message_id = str(uuid.uuid4())
+    parts = []
+    for chunk in llm.stream(prompt, config={"tags": [TAG_NOSTREAM]}, **cache_kwargs):
+        parts.append(rewriter.feed(chunk.text()))
+        _push_answer_chunk(message_id, parts[-1])
+    return _streamed_answer_update(message_id, parts, rewriter)
 
-    # init Reasoning Model, default to Gemini 2.5 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+
+async def afinalize_answer(state: OverallState, config: RunnableConfig):
+    """Async version of `finalize_answer`."""
+    configurable = Configuration.from_runnable_config(config)
+    reasoning_model = _answer_model(state, configurable)
+
+    user_id = "0" if state.get("user_id") is None else state.get("user_id")
+    research_topic = await aget_research_topic(
+        state["messages"],
+        configurable.research_topic_max_turns,
+        configurable.query_generator_model,
+    )
+    memory_items = await arecall_memory(
+        state.get("memory_snapshot"),
+        research_topic,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+        max_chars=configurable.memory_max_chars,
     )
-    result = llm.invoke(formatted_prompt)
 
-    # Replace the short urls with the original urls and add all used urls to the sources_gathered
-    unique_sources = []
-    for source in state["sources_gathered"]:
-        if source["short_url"] in result.content:
-            result.content = result.content.replace(
-                source["short_url"], source["value"]
-            )
-            unique_sources.append(source)
+    llm = get_chat_model(reasoning_model, temperature=0)
+    summaries = await abuild_summaries_context(
+        state["web_research_result"],
+        SUMMARIES_SEPARATOR,
+        **summaries_budget_options(configurable, research_topic),
+    )
+    prompt, cache_kwargs = await acached_prompt(
+        answer_static,
+        _format_answer_context(research_topic, summaries, memory_items),
+        reasoning_model,
+        configurable,
+    )
+    if not configurable.stream_answer:
+        result = await llm.ainvoke(prompt, **cache_kwargs)
+        return _answer_update(state, result)
 
-    return {
-        "messages": [AIMessage(content=result.content)],
-        "sources_gathered": unique_sources,
-    }
+    rewriter = ShortUrlRewriter(state.get("source_registry") or {})
+    message_id = str(uuid.uuid4())
+    parts = []
+    async for chunk in llm.astream(prompt, config={"tags": [TAG_NOSTREAM]}, **cache_kwargs):
+        parts.append(rewriter.feed(chunk.text()))
+        _push_answer_chunk(message_id, parts[-1])
+    return _streamed_answer_update(message_id, parts, rewriter)
@@ -1,12 +1,10 @@
-import os
-import uuid
+import asyncio
+from concurrent.futures import Future
 
-from langchain_core.prompts.prompt import PromptTemplate
-from langgraph.types import Send
-
-from src.agent.utils import get_message_intention
-from src.agent.tools_and_schemas import SearchQueryList
+from src.agent.utils import aget_message_intention, get_message_intention
+from src.agent.tools_and_schemas import IntentionAndQueries, SearchQueryList
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 
 from src.agent.state import (
     OverallState,
@@ -15,67 +13,207 @@ from src.agent.state import (
 from src.agent.configuration import Configuration
 from src.agent.prompts import (
     get_current_date,
-    query_writer_instructions,
+    intention_and_query_static,
+    query_writer_context,
+    query_writer_static,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.agent.clients import get_chat_model
 from src.agent.utils import (
+    aget_research_topic,
     get_research_topic,
 )
-from src.agent.memory.tools import get_memory_tools
-from src.agent.utils import parse_json_from_response
-from langgraph.prebuilt.chat_agent_executor import create_react_agent
-from langgraph.config import get_store
+from src.agent.utils import dedupe_queries
+
+from src.agent.memory.tools import arecall_memory, recall_memory
+from src.agent.routing import route_model
+from src.agent.prompt_cache import acached_prompt, cached_prompt
 
-from src.agent.memory.tools import search_in_memory
+
+# Runs the speculative query writer next to the intent classification, the
+# context is copied so the call stays attached to the node's run.
+_speculative_executor = ContextThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="speculative-query"
+)
 
 
-def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState|Send:
+def _discard_speculation(queries_future: Future) -> None:
+    # A call already running can't be stopped and is still paid for, its
+    # outcome is retrieved when it ends so an error is never left unobserved
+    if not queries_future.cancel():
+        queries_future.add_done_callback(lambda future: future.exception())
+
+
+def _format_query_writer_context(
+    state: OverallState, configurable: Configuration, research_topic: str, memory_items: str
+) -> str:
+    # check for custom initial search query count
+    number_queries = state.get("initial_search_query_count")
+    if number_queries is None:
+        number_queries = configurable.number_of_initial_queries
+
+    # Format the prompt
+    current_date = get_current_date()
+
+    prompt_variables = {
+        "current_date": current_date,
+        "research_topic": research_topic,
+        "number_queries": number_queries,
+        "memory": memory_items
+    }
+    return query_writer_context.format(**prompt_variables)
+
+
+def _query_writer_static(configurable: Configuration) -> str:
+    if configurable.intent_mode == "combined":
+        return intention_and_query_static
+    return query_writer_static
+
+
+def _query_update(
+    state: OverallState, configurable: Configuration, intention: str, queries: list[str]
+) -> QueryGenerationState:
+    # Check if list or string in result_search_query is not empty
+    if intention != 'web_research':
+        return {"query_list": []}
+    # Don't pay twice for a search already made on this thread
+    new_queries, skipped = dedupe_queries(
+        queries, state.get("search_query") or [], configurable.query_similarity_threshold
+    )
+    return {"query_list": new_queries, "skipped_query_count": skipped}
+
+
+def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
     """LangGraph node that generates search queries based on the User's question.
 
     Uses Gemini 2.0 Flash to create an optimized search queries for web research based on
-    the User's question.
+    the User's question. How the intent classification and the query writing are
+    combined depends on `intent_mode`.
 
     Args:
         state: Current graph state containing the User's question
         config: Configuration for the runnable, including LLM provider settings
 
     Returns:
-        Dictionary with state update, including search_query key containing the generated queries
+        Dictionary with state update, including query_list key containing the generated queries,
+        empty when the message does not need web research
     """
     configurable = Configuration.from_runnable_config(config)
 
     user_id = "0" if state.get("user_id") is None else state.get("user_id")
 
-    # check for custom initial search query count
-    if state.get("initial_search_query_count") is None:
-        state["initial_search_query_count"] = configurable.number_of_initial_queries
+    memory_items = recall_memory(
+        state.get("memory_snapshot"),
+        state['messages'][-1].content,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+        max_chars=configurable.memory_max_chars,
+    )
+    research_topic = get_research_topic(
+        state["messages"],
+        configurable.research_topic_max_turns,
+        configurable.query_generator_model,
+    )
+    context = _format_query_writer_context(state, configurable, research_topic, memory_items)
 
-    # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    # The intent is not classified yet, only the question can be scored
+    query_model = route_model(
+        "generate_query", state, configurable, configurable.query_generator_model, research=None
+    )
+    prompt, cache_kwargs = cached_prompt(
+        _query_writer_static(configurable), context, query_model, configurable
     )
-    structured_llm = llm.with_structured_output(SearchQueryList)
+    # Tool calling can't be combined with cached content, json mode can
+    method = "json_mode" if cache_kwargs else None
 
-    memory_items = search_in_memory(state['messages'][-1].content, user_id,  "long-term-memory")
+    if configurable.intent_mode == "combined":
+        combined_llm = get_chat_model(
+            query_model, temperature=1.0, schema=IntentionAndQueries, method=method
+        )
+        result = combined_llm.invoke(prompt, **cache_kwargs)
+        return _query_update(state, configurable, result.intention, result.query)
 
-    # Format the prompt
-    current_date = get_current_date()
+    # init Gemini 2.0 Flash
+    structured_llm = get_chat_model(
+        query_model, temperature=1.0, schema=SearchQueryList, method=method
+    )
 
-    prompt_variables = {
-        "current_date": current_date,
-        "research_topic": get_research_topic(state["messages"]),
-        "number_queries": state["initial_search_query_count"],
-        "memory": memory_items
-    }
+    if configurable.intent_mode == "speculative":
+        # Write the queries while the intention is classified, drop them if unused
+        queries_future = _speculative_executor.submit(structured_llm.invoke, prompt, **cache_kwargs)
+        queries = None
+        try:
+            message_intention = get_message_intention(state['messages'][-1])
+            if message_intention.intention == 'web_research':
+                queries = queries_future.result().query
+        finally:
+            if queries is None:
+                _discard_speculation(queries_future)
+        return _query_update(state, configurable, message_intention.intention, queries or [])
 
     message_intention = get_message_intention(state['messages'][-1])
+    if message_intention.intention != 'web_research':
+        return _query_update(state, configurable, message_intention.intention, [])
+    result = structured_llm.invoke(prompt, **cache_kwargs)
+    return _query_update(state, configurable, message_intention.intention, result.query)
 
-    # Check if list or string in result_search_query is not empty
-    if message_intention.intention == 'web_research':
-        result = structured_llm.invoke(query_writer_instructions.format(**prompt_variables))
-        return Send('web_research', {"search_query": result.query, 'messages': state['messages']})
-    else:
-        return Send('finalize_answer', state)
+
+async def agenerate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
+    """Async version of `generate_query`."""
+    configurable = Configuration.from_runnable_config(config)
+
+    user_id = "0" if state.get("user_id") is None else state.get("user_id")
+
+    memory_items = await arecall_memory(
+        state.get("memory_snapshot"),
+        state['messages'][-1].content,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+        max_chars=configurable.memory_max_chars,
+    )
+    research_topic = await aget_research_topic(
+        state["messages"],
+        configurable.research_topic_max_turns,
+        configurable.query_generator_model,
+    )
+    context = _format_query_writer_context(state, configurable, research_topic, memory_items)
+
+    # The intent is not classified yet, only the question can be scored
+    query_model = route_model(
+        "generate_query", state, configurable, configurable.query_generator_model, research=None
+    )
+    prompt, cache_kwargs = await acached_prompt(
+        _query_writer_static(configurable), context, query_model, configurable
+    )
+    # Tool calling can't be combined with cached content, json mode can
+    method = "json_mode" if cache_kwargs else None
+
+    if configurable.intent_mode == "combined":
+        combined_llm = get_chat_model(
+            query_model, temperature=1.0, schema=IntentionAndQueries, method=method
+        )
+        result = await combined_llm.ainvoke(prompt, **cache_kwargs)
+        return _query_update(state, configurable, result.intention, result.query)
+
+    structured_llm = get_chat_model(
+        query_model, temperature=1.0, schema=SearchQueryList, method=method
+    )
+
+    if configurable.intent_mode == "speculative":
+        queries_task = asyncio.create_task(structured_llm.ainvoke(prompt, **cache_kwargs))
+        try:
+            message_intention = await aget_message_intention(state['messages'][-1])
+        except BaseException:
+            queries_task.cancel()
+            raise
+        if message_intention.intention != 'web_research':
+            queries_task.cancel()
+            return _query_update(state, configurable, message_intention.intention, [])
+        return _query_update(state, configurable, message_intention.intention, (await queries_task).query)
+
+    message_intention = await aget_message_intention(state['messages'][-1])
+    if message_intention.intention != 'web_research':
+        return _query_update(state, configurable, message_intention.intention, [])
+    result = await structured_llm.ainvoke(prompt, **cache_kwargs)
+    return _query_update(state, configurable, message_intention.intention, result.query)
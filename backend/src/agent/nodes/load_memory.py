@@ -0,0 +1,51 @@
+from langchain_core.runnables import RunnableConfig
+
+from src.agent.state import (
+    OverallState,
+)
+from src.agent.configuration import Configuration
+from src.agent.memory.tools import aload_memory_snapshot, load_memory_snapshot
+from src.agent.budget import new_run_usage
+
+
+def load_memory(state: OverallState, config: RunnableConfig):
+    """LangGraph node that reads the user's long-term memory once per run.
+
+    The snapshot is kept in state and every later node ranks and formats its
+    memory block from it, instead of going back to the store. `memorize`
+    clears it when it writes new memories.
+
+    Args:
+        state: Current graph state containing the User's question
+        config: Configuration for the runnable, including the memory retrieval limits
+
+    Returns:
+        Dictionary with state update, including memory_snapshot key containing the memory records
+        and run_usage key starting the run budget
+    """
+    configurable = Configuration.from_runnable_config(config)
+    user_id = "0" if state.get("user_id") is None else state.get("user_id")
+
+    memory_snapshot = load_memory_snapshot(
+        state['messages'][-1].content,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+    )
+
+    return {"memory_snapshot": memory_snapshot, "run_usage": new_run_usage()}
+
+
+async def aload_memory(state: OverallState, config: RunnableConfig):
+    """Async version of `load_memory`."""
+    configurable = Configuration.from_runnable_config(config)
+    user_id = "0" if state.get("user_id") is None else state.get("user_id")
+
+    memory_snapshot = await aload_memory_snapshot(
+        state['messages'][-1].content,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+    )
+
+    return {"memory_snapshot": memory_snapshot, "run_usage": new_run_usage()}
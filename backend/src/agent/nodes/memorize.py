@@ -1,24 +1,43 @@
+import logging
 import os
+import threading
 import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
 from langchain_core.messages.system import SystemMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_store
+from langgraph.store.base import BaseStore
 
 from src.agent.state import (
     OverallState,
-    QueryGenerationState,
 )
 from src.agent.configuration import Configuration
-from src.agent.prompts import (
-    get_current_date,
+from src.agent.clients import get_chat_model
+from src.agent.utils import parse_json_from_response, render_transcript
+from src.agent.memory.tools import (
+    aadd_many_to_memory,
+    add_many_to_memory,
+    aload_memory_snapshot,
+    load_memory_snapshot,
+    select_new_memories,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.load import dumps
-from src.agent.utils import parse_json_from_response
-from src.agent.memory.tools import add_to_memory, search_in_memory
+from src.agent.memory.background import submit_memory_job
+from src.agent.budget import budget_exhausted
 
 
+logger = logging.getLogger(__name__)
+
+# Marks reached by the background jobs that succeeded, by thread: (last memorized
+# message id, its index, research count). A job ends after its run, so the next
+# memorize of the thread moves the state mark from here.
+MAX_COMPLETED_MARKS = 10000
+_completed_marks: OrderedDict[str, tuple[Optional[str], int, int]] = OrderedDict()
+_completed_marks_lock = threading.Lock()
+
 memory_instructions = """
-Analyze the following conversation state, list all facts that are not listed already in your memory and entities mentioned in order for memorize them.
+Analyze the following new conversation turns, list all facts that are not listed already in your memory and entities mentioned in order for memorize them.
 
 Return them in a JSON array of facts, example:
 ```json
@@ -33,67 +52,269 @@ Return them in a JSON array of facts, example:
 Important: do not duplicate facts.
 """
 memory_instructions_content = """
-```json
-{state}
-```
+Conversation:
+{conversation}{research}"""
+
+memory_research_content = """
+Research results:
+{results}
 """
 
-def memorize(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
-    """LangGraph node that generates search queries based on the User's question.
 
-    Uses Gemini 2.0 Flash to create an optimized search queries for web research based on
-    the User's question.
+def _message_index(state: OverallState, message_id: Optional[str]) -> int:
+    for index in range(len(state["messages"]) - 1, -1, -1):
+        if state["messages"][index].id == message_id:
+            return index
+    return -1
 
-    Args:
-        state: Current graph state containing the User's question
-        config: Configuration for the runnable, including LLM provider settings
+
+def _new_messages(state: OverallState) -> list:
+    """The messages after the last memorized one, every message on a new thread."""
+    index = _message_index(state, state.get("last_memorized_message_id"))
+    # Never memorized, or the history was replaced
+    return state["messages"][index + 1:] if index >= 0 else state["messages"]
+
+
+def _new_research(state: OverallState, configurable: Configuration) -> list[str]:
+    if not configurable.memorize_research:
+        return []
+    results = state.get("web_research_result") or []
+    return results[state.get("memorized_research_count") or 0:]
+
+
+def _extraction_input(state: OverallState, configurable: Configuration) -> list:
+    # Only what is new since the last memorize, the earlier turns are in memory already
+    research = _new_research(state, configurable)
+    prompt_variables = {
+        "conversation": render_transcript(_new_messages(state)),
+        "research": memory_research_content.format(results="\n---\n".join(research)) if research else "",
+    }
+
+    return [
+        SystemMessage(content=memory_instructions),
+        memory_instructions_content.format(**prompt_variables),
+    ]
+
+
+def _memorized_update(state: OverallState) -> OverallState:
+    # The memory changed, later runs on this thread must not reuse the snapshot
+    messages = state["messages"]
+    return {
+        "memory_snapshot": None,
+        "last_memorized_message_id": messages[-1].id if messages else None,
+        "memorized_research_count": len(state.get("web_research_result") or []),
+    }
+
+
+def _confirm_mark(thread_id: str, mark: tuple[Optional[str], int, int]) -> None:
+    with _completed_marks_lock:
+        confirmed = _completed_marks.get(thread_id)
+        # A slower job of an earlier turn must not move the mark back
+        if confirmed is None or confirmed[1] <= mark[1]:
+            _completed_marks[thread_id] = mark
+        _completed_marks.move_to_end(thread_id)
+        while len(_completed_marks) > MAX_COMPLETED_MARKS:
+            _completed_marks.popitem(last=False)
+
+
+def _confirmed_mark(state: OverallState, thread_id: Optional[str]) -> OverallState:
+    """The state mark, moved to the mark of the last background job that succeeded on the thread."""
+    mark = {
+        "last_memorized_message_id": state.get("last_memorized_message_id"),
+        "memorized_research_count": state.get("memorized_research_count") or 0,
+    }
+    with _completed_marks_lock:
+        confirmed = _completed_marks.get(thread_id) if thread_id is not None else None
+    if confirmed is not None:
+        message_id, _, research_count = confirmed
+        if _message_index(state, message_id) > _message_index(state, mark["last_memorized_message_id"]):
+            mark = {"last_memorized_message_id": message_id, "memorized_research_count": research_count}
+    return mark
+
+
+def _store_and_confirm(
+    state: OverallState,
+    configurable: Configuration,
+    user_id: str,
+    store: BaseStore,
+    thread_id: Optional[str],
+    mark: tuple[Optional[str], int, int],
+) -> list[str]:
+    new_facts = store_new_memories(state, configurable, user_id, store)
+    # Only reached when the facts are stored, a failed job leaves the mark where it was
+    if thread_id is not None:
+        _confirm_mark(thread_id, mark)
+    return new_facts
+
+
+def submit_in_background(
+    state: OverallState,
+    config: RunnableConfig,
+    configurable: Configuration,
+    user_id: str,
+    store: BaseStore,
+) -> tuple[OverallState, Future]:
+    """Hand the extraction of the new facts to a background job.
+
+    The memorize mark only moves once a job succeeded: a delta whose job failed,
+    is still running, or ran in another worker process is extracted again by
+    the next memorize of the thread, and the facts already stored are dropped
+    as duplicates. Delivery is at-least-once.
 
     Returns:
-        Dictionary with state update, including search_query key containing the generated queries
+        The state update, with the last confirmed mark, and the future of the job
     """
-    configurable = Configuration.from_runnable_config(config)
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    state = {**state, **_confirmed_mark(state, thread_id)}
+    messages = state["messages"]
+    job_mark = (
+        messages[-1].id if messages else None,
+        len(messages) - 1,
+        len(state.get("web_research_result") or []),
+    )
+    job = submit_memory_job(
+        _store_and_confirm, state, configurable, user_id, store, thread_id, job_mark
+    )
+    return {
+        "memory_snapshot": None,
+        "last_memorized_message_id": state["last_memorized_message_id"],
+        "memorized_research_count": state["memorized_research_count"],
+    }, job
+
+
+def _extraction_config() -> RunnableConfig:
     # 2) build a new config that specifies the tool you want downstream
-    tool_config = RunnableConfig(
+    return RunnableConfig(
         metadata={ "tool_to_call": "manage_memory" },
         tags=[ "tool:manage_memory" ]
     )
 
-    user_id = "0" if state.get("user_id") is None else state.get("user_id")
 
+def _new_facts(response, existing_memories: list, configurable: Configuration) -> list[str]:
+    resulted_json = parse_json_from_response(response.content)
+
+    # Check if resulted_json is an array
+    if not isinstance(resulted_json, list):
+        raise ValueError("resulted_json is not an array")
+
+    new_facts = select_new_memories(
+        [str(item) for item in resulted_json],
+        existing_memories,
+        configurable.memory_duplicate_threshold,
+    )
+    skipped = len(resulted_json) - len(new_facts)
+    if skipped:
+        logger.debug("Skipping %s facts already present in memory", skipped, extra={"skipped_facts": skipped})
+    return new_facts
+
+
+def store_new_memories(
+    state: OverallState,
+    configurable: Configuration,
+    user_id: str,
+    store: BaseStore,
+) -> list[str]:
+    """Extract the facts worth remembering from the run state and store the new ones.
+
+    Runs either inside the `memorize` node or as a background job, so the store is
+    passed explicitly.
+
+    Returns:
+        The facts that were written to the store
+    """
+    if not _new_messages(state) and not _new_research(state, configurable):
+        return []
     # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    llm = get_chat_model(configurable.query_generator_model, temperature=1.0)
+    response = llm.invoke(input=_extraction_input(state, configurable), config=_extraction_config())
+
+    # One read of the namespace, deduplication in-process and one bulk write
+    existing_memories = load_memory_snapshot('', user_id, "long-term-memory", store=store)
+    new_facts = _new_facts(response, existing_memories, configurable)
+    add_many_to_memory(
+        [(uuid.uuid4().hex, {'content': fact}) for fact in new_facts],
+        user_id,
+        "long-term-memory",
+        store=store,
     )
 
-    # Format the prompt
-    current_date = get_current_date()
+    return new_facts
 
-    prompt_variables = {
-        "current_date": current_date,
-        "state": dumps(state, pretty=True),
-    }
 
-    response = llm.invoke(input=[
-        SystemMessage(content=memory_instructions),
-        memory_instructions_content.format(**prompt_variables),
-    ], config=tool_config)
+async def astore_new_memories(
+    state: OverallState,
+    configurable: Configuration,
+    user_id: str,
+    store: BaseStore,
+) -> list[str]:
+    """Async version of `store_new_memories`."""
+    if not _new_messages(state) and not _new_research(state, configurable):
+        return []
+    llm = get_chat_model(configurable.query_generator_model, temperature=1.0)
+    response = await llm.ainvoke(input=_extraction_input(state, configurable), config=_extraction_config())
 
+    existing_memories = await aload_memory_snapshot('', user_id, "long-term-memory", store=store)
+    new_facts = _new_facts(response, existing_memories, configurable)
+    await aadd_many_to_memory(
+        [(uuid.uuid4().hex, {'content': fact}) for fact in new_facts],
+        user_id,
+        "long-term-memory",
+        store=store,
+    )
 
-    resulted_json = parse_json_from_response(response.content)
+    return new_facts
 
-    # Check if resulted_json is an array
-    if isinstance(resulted_json, list):
-        for item in resulted_json:
-            similar_memories = search_in_memory(item, user_id, "long-term-memory")
-            # Check if its a list and has less than 4 records
-            if isinstance(similar_memories, list) and len(similar_memories) < 4:
-                add_to_memory(uuid.uuid4().hex, {'content': item}, user_id, "long-term-memory")
-            else:
-                print(f"Skipping item '{item}' as it already has more than 4 similar memories.")
-    else:
-        raise ValueError("resulted_json is not an array")
 
-    return {}
+def memorize(state: OverallState, config: RunnableConfig):
+    """LangGraph node that stores the new facts of the run in the long-term memory.
+
+    Only the messages added since the last memorize of the thread, and with
+    `memorize_research` the new research results, are sent to the extraction.
+    With `memorize_in_background` enabled the extraction is handed to a background
+    job and the node returns right away, so the run ends as soon as the answer exists.
+    Nothing is memorized once the run budget is spent.
+
+    Args:
+        state: Current graph state containing the conversation and the research results
+        config: Configuration for the runnable, including LLM provider settings
+
+    Returns:
+        Dictionary with state update, clearing the memory_snapshot key and moving
+        the last_memorized_message_id mark to the last message, or in the background
+        to the last message of the last job that succeeded
+    """
+    configurable = Configuration.from_runnable_config(config)
+    exhausted = budget_exhausted(state.get("run_usage"), configurable)
+    if exhausted:
+        logger.info("Run budget spent (%s), skipping memorize", exhausted, extra={"exhausted": exhausted})
+        return {"memory_snapshot": None}
+
+    user_id = "0" if state.get("user_id") is None else state.get("user_id")
+    store = get_store()
+
+    if configurable.memorize_in_background:
+        update, _ = submit_in_background(state, config, configurable, user_id, store)
+        return update
+    store_new_memories(state, configurable, user_id, store)
+
+    return _memorized_update(state)
+
+
+async def amemorize(state: OverallState, config: RunnableConfig):
+    """Async version of `memorize`."""
+    configurable = Configuration.from_runnable_config(config)
+    exhausted = budget_exhausted(state.get("run_usage"), configurable)
+    if exhausted:
+        logger.info("Run budget spent (%s), skipping memorize", exhausted, extra={"exhausted": exhausted})
+        return {"memory_snapshot": None}
+
+    user_id = "0" if state.get("user_id") is None else state.get("user_id")
+    store = get_store()
+
+    if configurable.memorize_in_background:
+        # The background job runs in a worker thread and uses the sync store API
+        update, _ = submit_in_background(state, config, configurable, user_id, store)
+        return update
+    await astore_new_memories(state, configurable, user_id, store)
+
+    return _memorized_update(state)
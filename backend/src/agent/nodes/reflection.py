@@ -1,4 +1,6 @@
+import logging
 import os
+from typing import Optional
 
 from src.agent.tools_and_schemas import Reflection
 from langchain_core.runnables import RunnableConfig
@@ -9,14 +11,94 @@ from src.agent.state import (
 )
 from src.agent.configuration import Configuration
 from src.agent.prompts import (
-    get_current_date,
-    reflection_instructions,
+    reflection_context,
+    reflection_static,
+)
+from src.agent.clients import get_chat_model
+from src.agent.context import (
+    abuild_summaries_context,
+    build_summaries_context,
+    summaries_budget_options,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
 from src.agent.utils import (
+    dedupe_queries,
+    aget_research_topic,
     get_research_topic,
 )
-from src.agent.memory.tools import search_in_memory
+from src.agent.memory.tools import arecall_memory, recall_memory
+from src.agent.research_gain import ResearchGain, measure_research_gain
+from src.agent.budget import budget_exhausted
+from src.agent.routing import route_model
+from src.agent.prompt_cache import acached_prompt, cached_prompt
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARIES_SEPARATOR = "\n\n---\n\n"
+
+
+def _format_reflection_context(research_topic: str, summaries: str, memory_items: str) -> str:
+    # Format the prompt
+    return reflection_context.format(
+        research_topic=research_topic,
+        summaries=summaries,
+        memory=memory_items
+    )
+
+
+def _loop_gain(state: OverallState) -> ResearchGain:
+    previous = state.get("research_gain") or []
+    return measure_research_gain(
+        state["web_research_result"],
+        state.get("source_ids") or [],
+        previous[-1] if previous else None,
+        state.get("research_loop_count", 0) + 1,
+    )
+
+
+def _skip_reason(state: OverallState, configurable: Configuration, gain: ResearchGain) -> Optional[str]:
+    # No other loop will run, the reflection call would be wasted
+    if gain["gain"] < configurable.min_research_gain:
+        return f"gain {gain['gain']} is under {configurable.min_research_gain}"
+    exhausted = budget_exhausted(state.get("run_usage"), configurable)
+    return f"run budget spent ({exhausted})" if exhausted else None
+
+
+def _skipped_reflection_update(state: OverallState, gain: ResearchGain, reason: str) -> ReflectionState:
+    logger.info(
+        "Skipping the reflection of research loop %s: %s",
+        gain["loop"],
+        reason,
+        extra={"loop": gain["loop"], "gain": gain["gain"], "reason": reason},
+    )
+    return {
+        "is_sufficient": False,
+        "knowledge_gap": "",
+        "follow_up_queries": [],
+        "research_loop_count": gain["loop"],
+        "number_of_ran_queries": len(state["search_query"]),
+        "research_gain": [gain],
+    }
+
+
+def _reflection_update(
+    state: OverallState, configurable: Configuration, result: Reflection, gain: ResearchGain
+) -> ReflectionState:
+    # Reflection often asks again for queries that were already searched
+    follow_up_queries, skipped = dedupe_queries(
+        result.follow_up_queries,
+        state["search_query"],
+        configurable.query_similarity_threshold,
+    )
+    return {
+        "is_sufficient": result.is_sufficient,
+        "knowledge_gap": result.knowledge_gap,
+        "follow_up_queries": follow_up_queries,
+        "skipped_query_count": skipped,
+        "research_loop_count": state.get("research_loop_count", 0) + 1,
+        "number_of_ran_queries": len(state["search_query"]),
+        "research_gain": [gain],
+    }
 
 
 def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
@@ -34,33 +116,106 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
         Dictionary with state update, including search_query key containing the generated follow-up query
     """
     configurable = Configuration.from_runnable_config(config)
+    gain = _loop_gain(state)
+    skip_reason = _skip_reason(state, configurable, gain)
+    if skip_reason:
+        return _skipped_reflection_update(state, gain, skip_reason)
+
     user_id = "0" if state.get("user_id") is None else state.get("user_id")
-    memory_items = search_in_memory('', user_id,  "long-term-memory")
-    # Increment the research loop count and get the reasoning model
-    state["research_loop_count"] = state.get("research_loop_count", 0) + 1
-    reasoning_model = state.get("reasoning_model", configurable.reflection_model)
+    research_topic = get_research_topic(
+        state["messages"],
+        configurable.research_topic_max_turns,
+        configurable.query_generator_model,
+    )
+    memory_items = recall_memory(
+        state.get("memory_snapshot"),
+        research_topic,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+        max_chars=configurable.memory_max_chars,
+    )
+    # Get the reasoning model
+    reasoning_model = route_model(
+        "reflection",
+        state,
+        configurable,
+        state.get("reasoning_model", configurable.reflection_model),
+        heavy_model=state.get("reasoning_model"),
+    )
 
-    # Format the prompt
-    current_date = get_current_date()
-    formatted_prompt = reflection_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
-        memory=memory_items
+    summaries = build_summaries_context(
+        state["web_research_result"],
+        SUMMARIES_SEPARATOR,
+        **summaries_budget_options(configurable, research_topic),
+    )
+    prompt, cache_kwargs = cached_prompt(
+        reflection_static,
+        _format_reflection_context(research_topic, summaries, memory_items),
+        reasoning_model,
+        configurable,
     )
-    # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
+
+    # init Reasoning Model, in json mode with cached content, which excludes tool calling
+    structured_llm = get_chat_model(
+        reasoning_model,
         temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+        schema=Reflection,
+        method="json_mode" if cache_kwargs else None,
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
+    result = structured_llm.invoke(prompt, **cache_kwargs)
 
-    return {
-        "is_sufficient": result.is_sufficient,
-        "knowledge_gap": result.knowledge_gap,
-        "follow_up_queries": result.follow_up_queries,
-        "research_loop_count": state["research_loop_count"],
-        "number_of_ran_queries": len(state["search_query"]),
-    }
+    return _reflection_update(state, configurable, result, gain)
+
+
+async def areflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+    """Async version of `reflection`."""
+    configurable = Configuration.from_runnable_config(config)
+    gain = _loop_gain(state)
+    skip_reason = _skip_reason(state, configurable, gain)
+    if skip_reason:
+        return _skipped_reflection_update(state, gain, skip_reason)
+
+    user_id = "0" if state.get("user_id") is None else state.get("user_id")
+    research_topic = await aget_research_topic(
+        state["messages"],
+        configurable.research_topic_max_turns,
+        configurable.query_generator_model,
+    )
+    memory_items = await arecall_memory(
+        state.get("memory_snapshot"),
+        research_topic,
+        user_id,
+        "long-term-memory",
+        limit=configurable.memory_search_limit,
+        max_chars=configurable.memory_max_chars,
+    )
+    reasoning_model = route_model(
+        "reflection",
+        state,
+        configurable,
+        state.get("reasoning_model", configurable.reflection_model),
+        heavy_model=state.get("reasoning_model"),
+    )
+
+    summaries = await abuild_summaries_context(
+        state["web_research_result"],
+        SUMMARIES_SEPARATOR,
+        **summaries_budget_options(configurable, research_topic),
+    )
+    prompt, cache_kwargs = await acached_prompt(
+        reflection_static,
+        _format_reflection_context(research_topic, summaries, memory_items),
+        reasoning_model,
+        configurable,
+    )
+
+    structured_llm = get_chat_model(
+        reasoning_model,
+        temperature=1.0,
+        schema=Reflection,
+        method="json_mode" if cache_kwargs else None,
+    )
+    result = await structured_llm.ainvoke(prompt, **cache_kwargs)
+
+    return _reflection_update(state, configurable, result, gain)
@@ -1,7 +1,7 @@
 import os
+import time
 
 from langchain_core.runnables import RunnableConfig
-from google.genai import Client
 
 from src.agent.state import (
     OverallState,
@@ -17,10 +17,62 @@ from src.agent.utils import (
     insert_citation_markers,
     resolve_urls,
 )
-from src.agent.memory.tools import search_in_memory
+from src.agent.memory.tools import arecall_memory, recall_memory
+from src.agent.clients import get_genai_client
+from src.agent.search_cache import get_search_cache
+from src.agent.events import publish_web_research_event
+from src.agent.budget import record_search_usage
+from src.agent.instrumentation import record_search_call
+from src.agent.sources import register_citations
+
+
+def _format_search_prompt(state: WebSearchState, memory_items: str) -> str:
+    return web_searcher_instructions.format(
+        current_date=get_current_date(),
+        research_topic=state["search_query"],
+        memory=memory_items
+    )
+
+
+def _search_config() -> dict:
+    return {
+        "tools": [{"google_search": {}}],
+        "temperature": 0,
+    }
+
+
+def _research_update(state: WebSearchState, response) -> OverallState:
+    # resolve the urls to short urls for saving tokens and time
+    resolved_urls = resolve_urls(
+        response.candidates[0].grounding_metadata.grounding_chunks
+    )
+    # Gets the citations and adds them to the generated text
+    citations = get_citations(response, resolved_urls)
+    modified_text = insert_citation_markers(response.text, citations)
+    # Each cited url once, other branches citing it register the same short id
+    registry = register_citations(citations)
+
+    return {
+        "source_registry": registry,
+        "source_ids": list(registry),
+        "search_query": [state["search_query"]],
+        "web_research_result": [modified_text],
+    }
+
+
+def _finish_research(state: WebSearchState, response, started_at: float, cached: bool) -> OverallState:
+    update = _research_update(state, response)
+    # Let the client show this branch before the others and reflection are done
+    publish_web_research_event(
+        state["id"],
+        state["search_query"],
+        response.text,
+        update["source_ids"],
+        started_at,
+        cached,
+    )
+    return update
 
-# Used for Google Search API
-genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
 
 def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """LangGraph node that performs web research using the native Google Search API tool.
@@ -32,38 +84,76 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
         config: Configuration for the runnable, including search API settings
 
     Returns:
-        Dictionary with state update, including sources_gathered, research_loop_count, and web_research_results
+        Dictionary with state update, including source_registry, source_ids, search_query, and web_research_result
     """
     # Configure
+    started_at = time.perf_counter()
     configurable = Configuration.from_runnable_config(config)
-    user_id = "0" if state.get("user_id") is None else state.get("user_id")
-    memory_items = search_in_memory('', user_id,  "long-term-memory")
-    formatted_prompt = web_searcher_instructions.format(
-        current_date=get_current_date(),
-        research_topic=state["search_query"],
-        memory=memory_items
-    )
+    search_cache = get_search_cache(configurable)
+    if search_cache is not None:
+        response = search_cache.get(configurable.query_generator_model, state["search_query"])
+        if response is not None:
+            return _finish_research(state, response, started_at, cached=True)
+        # Shared results must not depend on the user's memory
+        memory_items = ""
+    else:
+        user_id = "0" if state.get("user_id") is None else state.get("user_id")
+        memory_items = recall_memory(
+            state.get("memory_snapshot"),
+            state["search_query"],
+            user_id,
+            "long-term-memory",
+            limit=configurable.memory_search_limit,
+            max_chars=configurable.memory_max_chars,
+        )
 
     # Uses the google genai client as the langchain client doesn't return grounding metadata
-    response = genai_client.models.generate_content(
+    search_started_at = time.perf_counter()
+    response = get_genai_client().models.generate_content(
         model=configurable.query_generator_model,
-        contents=formatted_prompt,
-        config={
-            "tools": [{"google_search": {}}],
-            "temperature": 0,
-        },
+        contents=_format_search_prompt(state, memory_items),
+        config=_search_config(),
     )
-    # resolve the urls to short urls for saving tokens and time
-    resolved_urls = resolve_urls(
-        response.candidates[0].grounding_metadata.grounding_chunks, state["id"]
-    )
-    # Gets the citations and adds them to the generated text
-    citations = get_citations(response, resolved_urls)
-    modified_text = insert_citation_markers(response.text, citations)
-    sources_gathered = [item for citation in citations for item in citation["segments"]]
+    record_search_usage(response)
+    record_search_call(configurable.query_generator_model, search_started_at, response)
+    if search_cache is not None:
+        search_cache.put(configurable.query_generator_model, state["search_query"], response)
+    return _finish_research(state, response, started_at, cached=False)
 
-    return {
-        "sources_gathered": sources_gathered,
-        "search_query": [state["search_query"]],
-        "web_research_result": [modified_text],
-    }
+
+async def aweb_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+    """Async version of `web_research`.
+
+    The grounded search goes through the async google genai client, so a fan-out
+    branch waiting on Google Search does not hold a worker thread.
+    """
+    started_at = time.perf_counter()
+    configurable = Configuration.from_runnable_config(config)
+    search_cache = get_search_cache(configurable)
+    if search_cache is not None:
+        response = await search_cache.aget(configurable.query_generator_model, state["search_query"])
+        if response is not None:
+            return _finish_research(state, response, started_at, cached=True)
+        memory_items = ""
+    else:
+        user_id = "0" if state.get("user_id") is None else state.get("user_id")
+        memory_items = await arecall_memory(
+            state.get("memory_snapshot"),
+            state["search_query"],
+            user_id,
+            "long-term-memory",
+            limit=configurable.memory_search_limit,
+            max_chars=configurable.memory_max_chars,
+        )
+
+    search_started_at = time.perf_counter()
+    response = await get_genai_client().aio.models.generate_content(
+        model=configurable.query_generator_model,
+        contents=_format_search_prompt(state, memory_items),
+        config=_search_config(),
+    )
+    record_search_usage(response)
+    record_search_call(configurable.query_generator_model, search_started_at, response)
+    if search_cache is not None:
+        await search_cache.aput(configurable.query_generator_model, state["search_query"], response)
+    return _finish_research(state, response, started_at, cached=False)
@@ -0,0 +1,183 @@
+"""Explicit context caching of the static prompt prefixes.
+
+The static instructions of a prompt (see prompts.py) are registered once per
+model as cached content, and the calls then only send the context suffix with
+`cached_content=<name>`, so the provider doesn't prefill the instructions
+again. The "local" mode registers the prefixes in process only, for tests and
+benchmarks with stand-in models.
+
+The grounded search of web_research is not cached explicitly: Gemini rejects
+cached content next to the `google_search` tool of the request. Its prompt
+still starts with the static prefix, which the provider's implicit prefix
+cache can reuse.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+from src.agent.clients import get_genai_client
+
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CACHE_MODES = ("none", "gemini", "local")
+
+# A prefix is registered again a bit before the provider drops it
+EXPIRY_MARGIN_SECONDS = 60
+
+
+class _CachedPrefix(NamedTuple):
+    name: Optional[str]
+    expires_at: float
+
+
+_cached_prefixes: dict[tuple[str, str, str], _CachedPrefix] = {}
+_local_prefixes: dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def _prefix_key(mode: str, model: str, prefix: str) -> tuple[str, str, str]:
+    return mode, model, hashlib.sha256(prefix.encode()).hexdigest()
+
+
+def _lookup(key: tuple[str, str, str]) -> Optional[_CachedPrefix]:
+    with _lock:
+        cached = _cached_prefixes.get(key)
+    if cached is None or cached.expires_at <= time.time():
+        return None
+    return cached
+
+
+def _remember(key: tuple[str, str, str], name: Optional[str], ttl_seconds: int) -> Optional[str]:
+    # A failed registration is remembered too, so it is not retried on every call
+    expires_at = time.time() + max(ttl_seconds - EXPIRY_MARGIN_SECONDS, 0)
+    with _lock:
+        _cached_prefixes[key] = _CachedPrefix(name, expires_at)
+    return name
+
+
+def _cache_config(prefix: str, ttl_seconds: int):
+    from google.genai import types
+
+    return types.CreateCachedContentConfig(
+        display_name="agent-prompt-prefix",
+        contents=[prefix],
+        ttl=f"{ttl_seconds}s",
+    )
+
+
+def _register_local(key: tuple[str, str, str], prefix: str) -> str:
+    name = f"cachedContents/local-{key[2][:16]}"
+    with _lock:
+        _local_prefixes[name] = prefix
+    return name
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in PROMPT_CACHE_MODES:
+        raise ValueError(f"Unknown prompt_cache {mode!r}, expected one of {PROMPT_CACHE_MODES}")
+
+
+def get_cached_prefix(model: str, prefix: str, mode: str, ttl_seconds: int) -> Optional[str]:
+    """Return the cached content name of a static prefix, registering it first if needed.
+
+    Args:
+        model: Name of the Gemini model the prefix is cached for.
+        prefix: Static instructions, already formatted.
+        mode: "none", "gemini" or "local".
+        ttl_seconds: Lifetime of the cached content.
+
+    Returns:
+        The name to pass as `cached_content`, `None` when the prefix is not cached,
+        e.g. when it is shorter than the provider's minimum.
+    """
+    _check_mode(mode)
+    if mode == "none":
+        return None
+    key = _prefix_key(mode, model, prefix)
+    cached = _lookup(key)
+    if cached is not None:
+        return cached.name
+    if mode == "local":
+        return _remember(key, _register_local(key, prefix), ttl_seconds)
+    try:
+        cache = get_genai_client().caches.create(model=model, config=_cache_config(prefix, ttl_seconds))
+    except Exception as error:
+        logger.warning(
+            "Prompt prefix not cached for %s: %s", model, error, extra={"model": model, "error": str(error)}
+        )
+        return _remember(key, None, ttl_seconds)
+    return _remember(key, cache.name, ttl_seconds)
+
+
+async def aget_cached_prefix(model: str, prefix: str, mode: str, ttl_seconds: int) -> Optional[str]:
+    """Async version of `get_cached_prefix`."""
+    _check_mode(mode)
+    if mode == "none":
+        return None
+    key = _prefix_key(mode, model, prefix)
+    cached = _lookup(key)
+    if cached is not None:
+        return cached.name
+    if mode == "local":
+        return _remember(key, _register_local(key, prefix), ttl_seconds)
+    try:
+        cache = await get_genai_client().aio.caches.create(
+            model=model, config=_cache_config(prefix, ttl_seconds)
+        )
+    except Exception as error:
+        logger.warning(
+            "Prompt prefix not cached for %s: %s", model, error, extra={"model": model, "error": str(error)}
+        )
+        return _remember(key, None, ttl_seconds)
+    return _remember(key, cache.name, ttl_seconds)
+
+
+def local_cached_prefix(name: str) -> Optional[str]:
+    """Return the prefix registered under a "local" cached content name."""
+    with _lock:
+        return _local_prefixes.get(name)
+
+
+def _call(context: str, prefix: str, cache_name: Optional[str]) -> tuple[str, dict[str, Any]]:
+    if cache_name is None:
+        return prefix + context, {}
+    return context, {"cached_content": cache_name}
+
+
+def cached_prompt(static: str, context: str, model: str, configurable) -> tuple[str, dict[str, Any]]:
+    """Return the prompt to send and the invoke keyword arguments of a model call.
+
+    Args:
+        static: Static template of the prompt, its `{{ }}` escapes are unescaped here.
+        context: Formatted context suffix.
+        model: Name of the model called.
+        configurable: Configuration of the run, `prompt_cache` picks the mode.
+
+    Returns:
+        The context suffix and `cached_content` when the prefix is cached, the
+        whole prompt and no arguments otherwise.
+    """
+    prefix = static.format()
+    cache_name = get_cached_prefix(
+        model, prefix, configurable.prompt_cache, configurable.prompt_cache_ttl_seconds
+    )
+    return _call(context, prefix, cache_name)
+
+
+async def acached_prompt(static: str, context: str, model: str, configurable) -> tuple[str, dict[str, Any]]:
+    """Async version of `cached_prompt`."""
+    prefix = static.format()
+    cache_name = await aget_cached_prefix(
+        model, prefix, configurable.prompt_cache, configurable.prompt_cache_ttl_seconds
+    )
+    return _call(context, prefix, cache_name)
+
+
+def reset_prompt_cache() -> None:
+    """Forget every registered prefix, the provider's cached contents expire on their own."""
+    with _lock:
+        _cached_prefixes.clear()
+        _local_prefixes.clear()
@@ -6,25 +6,23 @@ def get_current_date():
     return datetime.now().strftime("%B %d, %Y")
 
 
-query_writer_instructions = """
-# Long-Term Memory
-
-Your memory content:
-{memory}
-
---------------------------
+# Every template is a static instructions prefix followed by a context suffix
+# holding the per-call variables. The prefix is the same for every user and
+# call, so the provider can serve it from its prefix cache, and it can be
+# registered as cached content (see prompt_cache.py). The `*_instructions`
+# templates are the two parts joined.
 
-# Instructions
+query_writer_static = """# Instructions
 
 Your goal is to generate sophisticated and diverse web search queries. These queries are intended for an advanced automated web research tool capable of analyzing complex results, following links, and synthesizing information.
 
 Instructions:
 - Always prefer a single search query, only add another query if the original question requests multiple aspects or elements and one query is not enough.
 - Each query should focus on one specific aspect of the original question.
-- Don't produce more than {number_queries} queries.
+- Don't produce more than the maximum number of queries given in the context below.
 - Queries should be diverse, if the topic is broad, generate more than 1 query.
 - Don't generate multiple similar queries, 1 is enough.
-- Query should ensure that the most current information is gathered. The current date is {current_date}.
+- Query should ensure that the most current information is gathered, as of the current date given in the context below.
 
 Format:
 - Format your response as a JSON object with ALL two of these exact keys:
@@ -40,11 +38,11 @@ Topic: What revenue grew more last year apple stock or the number of people buyi
     "query": ["Apple total revenue growth fiscal year 2024", "iPhone unit sales growth fiscal year 2024", "Apple stock price growth fiscal year 2024"],
 }}
 ```
+"""
 
-Context: {research_topic}"""
-
+query_writer_context = """
+--------------------------
 
-web_searcher_instructions = """
 # Long-Term Memory
 
 Your memory content:
@@ -52,22 +50,46 @@ Your memory content:
 
 --------------------------
 
-# Instructions
-Conduct targeted Google Searches to gather the most recent, credible information on "{research_topic}" and synthesize it into a verifiable text artifact.
+Current date: {current_date}
+Maximum number of queries: {number_queries}
+
+Context: {research_topic}"""
+
+query_writer_instructions = query_writer_static + query_writer_context
+
+
+intention_static = """
+--------------------------
+
+# Intention
+
+Before writing the queries, decide the intention of the user's last message:
+- "web_research": answering it needs new information from the web.
+- "finalize_answer": it can be answered from the conversation and your memory alone. In that case return an empty "query" list.
+
+Add the "intention" key to the JSON object, next to "rationale" and "query".
+"""
+
+intention_and_query_static = query_writer_static + intention_static
+
+intention_and_query_instructions = intention_and_query_static + query_writer_context
+
+
+web_searcher_static = """# Instructions
+Conduct targeted Google Searches to gather the most recent, credible information on the research topic given below and synthesize it into a verifiable text artifact.
 
 Instructions:
-- Query should ensure that the most current information is gathered. The current date is {current_date}.
+- Query should ensure that the most current information is gathered, as of the current date given below.
 - Conduct multiple, diverse searches to gather comprehensive information.
 - Consolidate key findings while meticulously tracking the source(s) for each specific piece of information.
 - The output should be a well-written summary or report based on your search findings.
 - Only include the information found in the search results, don't make up any information.
 - Always save in your memory the relevant detailed information about the query and the results.
-
-Research Topic:
-{research_topic}
 """
 
-reflection_instructions = """
+web_searcher_context = """
+--------------------------
+
 # Long-Term Memory
 
 Your memory content:
@@ -75,8 +97,17 @@ Your memory content:
 
 --------------------------
 
-# Instructions
-You are an expert research assistant analyzing summaries about "{research_topic}".
+Current date: {current_date}
+
+Research Topic:
+{research_topic}
+"""
+
+web_searcher_instructions = web_searcher_static + web_searcher_context
+
+
+reflection_static = """# Instructions
+You are an expert research assistant analyzing summaries about the research topic given below.
 
 Instructions:
 - Identify knowledge gaps or areas that need deeper exploration and generate a follow-up query. (1 or multiple).
@@ -104,13 +135,12 @@ Example:
 }}
 ```
 
-Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following this JSON format:
-
-Summaries:
-{summaries}
+Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following this JSON format.
 """
 
-answer_instructions = """
+reflection_context = """
+--------------------------
+
 # Long-Term Memory
 
 Your memory content:
@@ -118,20 +148,79 @@ Your memory content:
 
 --------------------------
 
-# Instructions
+Research Topic:
+{research_topic}
+
+Summaries:
+{summaries}
+"""
+
+reflection_instructions = reflection_static + reflection_context
+
+
+answer_static = """# Instructions
 Generate a high-quality answer to the user's question based on the provided summaries.
 
 Instructions:
-- The current date is {current_date}.
+- The current date is given in the context below.
 - You are the final step of a multi-step research process, don't mention that you are the final step.
 - You have access to all the information gathered from the previous steps.
 - You have access to the user's question.
 - Generate a high-quality answer to the user's question based on the provided summaries and the user's question.
-- Include the sources you used from the Summaries in the answer correctly, use markdown format (e.g. [apnews](https://vertexaisearch.cloud.google.com/id/1-0)). THIS IS A MUST.
+- Include the sources you used from the Summaries in the answer correctly, use markdown format (e.g. [apnews](https://vertexaisearch.cloud.google.com/id/3f2a9c1e)). THIS IS A MUST.
 - Always Search in your memory the relevant information to use in your response.
+"""
+
+answer_context = """
+--------------------------
+
+# Long-Term Memory
+
+Your memory content:
+{memory}
+
+--------------------------
+
+Current date: {current_date}
 
 User Context:
 - {research_topic}
 
 Summaries:
 {summaries}"""
+
+answer_instructions = answer_static + answer_context
+
+research_digest_instructions = """Condense the following research summary into at most {max_words} words for a research assistant.
+
+Instructions:
+- Keep the facts, figures, dates and names that matter for "{research_topic}".
+- Keep every markdown citation link attached to a fact you keep, unchanged.
+- Don't add information that is not in the summary.
+
+Summary:
+{summary}"""
+
+
+conversation_summary_instructions = """Update the summary of an ongoing conversation between a user and a research assistant, in at most {max_words} words.
+
+Instructions:
+- Merge the new conversation turns into the current summary.
+- Keep what the user asked for, their constraints and preferences, and the conclusions already given.
+- Don't add information that is not in the summary or the turns.
+
+Current summary:
+{summary}
+
+New conversation turns:
+{conversation}"""
+
+
+memory_merge_instructions = """Merge the following memories about a user into a single memory.
+
+Instructions:
+- Keep every detail that appears in any of them. When they disagree, keep the first one, they are listed from the most recent.
+- Answer with the merged memory only, in one or two sentences.
+
+Memories:
+{memories}"""
@@ -0,0 +1,77 @@
+import re
+from typing import List, Optional, TypedDict
+
+from src.agent.utils import jaccard_similarity, text_tokens
+
+
+# Citation markers only hold short urls, they would make every result look alike
+_CITATION_RE = re.compile(r"\[[^\]]*\]\([^)]*\)")
+
+
+class ResearchGain(TypedDict):
+    """Marginal information brought by one research loop."""
+
+    loop: int
+    new_results: int
+    new_sources: int
+    new_source_ratio: float
+    novelty: float
+    gain: float
+    # Totals once the loop is done, the next loop is measured from there
+    result_count: int
+    source_count: int
+
+
+def _result_tokens(text: str) -> set[str]:
+    return text_tokens(_CITATION_RE.sub(" ", text))
+
+
+def measure_research_gain(
+    results: List[str],
+    source_ids: List[str],
+    previous: Optional[ResearchGain],
+    loop: int,
+) -> ResearchGain:
+    """Measure what the results of the last research loop add to the earlier ones.
+
+    `new_source_ratio` is the share of the loop's distinct sources that were
+    not found before, `novelty` the mean of one minus the highest word overlap of
+    each new result with an earlier one. `gain` is their mean, 1 when nothing was
+    researched before.
+
+    Args:
+        results: Every web research result so far, oldest first.
+        source_ids: The short ids of every source cited so far, oldest first.
+        previous: The gain of the previous loop, `None` for the first one.
+        loop: The number of the loop being measured, starting at 1.
+    """
+    result_start = previous["result_count"] if previous else 0
+    source_start = previous["source_count"] if previous else 0
+    earlier_results, new_results = results[:result_start], results[result_start:]
+    earlier_urls = set(source_ids[:source_start])
+    new_urls = set(source_ids[source_start:])
+
+    new_sources = len(new_urls - earlier_urls)
+    new_source_ratio = new_sources / len(new_urls) if new_urls else 0.0
+    if earlier_results:
+        earlier_tokens = [_result_tokens(text) for text in earlier_results]
+        novelties = [
+            1.0 - max(jaccard_similarity(_result_tokens(text), tokens) for tokens in earlier_tokens)
+            for text in new_results
+        ]
+        novelty = sum(novelties) / len(novelties) if novelties else 0.0
+        gain = (new_source_ratio + novelty) / 2
+    else:
+        novelty = 1.0 if new_results else 0.0
+        gain = novelty
+
+    return {
+        "loop": loop,
+        "new_results": len(new_results),
+        "new_sources": new_sources,
+        "new_source_ratio": round(new_source_ratio, 4),
+        "novelty": round(novelty, 4),
+        "gain": round(gain, 4),
+        "result_count": len(results),
+        "source_count": len(source_ids),
+    }
@@ -0,0 +1,90 @@
+import logging
+from typing import Any, Optional
+
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("light", "standard", "heavy")
+
+# Sizes at which a signal counts as fully complex
+TOPIC_WORDS_FOR_FULL_SCORE = 60
+SOURCES_FOR_FULL_SCORE = 15
+
+
+def routing_signals(state: dict, configurable, research: Optional[bool]) -> dict[str, Any]:
+    """The request features the routing scores, `research` is `None` when the intent is not known yet."""
+    max_research_loops = (
+        state.get("max_research_loops")
+        if state.get("max_research_loops") is not None
+        else configurable.max_research_loops
+    )
+    return {
+        "topic_words": len(str(state["messages"][-1].content).split()),
+        "sources": len(state.get("source_registry") or {}),
+        "loops": state.get("research_loop_count") or 0,
+        "max_loops": max(max_research_loops, 1),
+        "research": research,
+    }
+
+
+def complexity_score(signals: dict[str, Any]) -> float:
+    """Score a request from 0 (trivial) to 1 (long question, many sources, every loop used)."""
+    score = (
+        0.4 * min(signals["topic_words"] / TOPIC_WORDS_FOR_FULL_SCORE, 1)
+        + 0.3 * min(signals["sources"] / SOURCES_FOR_FULL_SCORE, 1)
+        + 0.3 * min(signals["loops"] / signals["max_loops"], 1)
+    )
+    # Answering without research is conversation, not synthesis
+    if signals["research"] is False:
+        score *= 0.5
+    return score
+
+
+def score_tier(score: float, configurable) -> str:
+    if score <= configurable.routing_light_max_score:
+        return "light"
+    if score >= configurable.routing_heavy_min_score:
+        return "heavy"
+    return "standard"
+
+
+def route_model(
+    node: str,
+    state: dict,
+    configurable,
+    default_model: str,
+    research: Optional[bool] = True,
+    heavy_model: Optional[str] = None,
+) -> str:
+    """Pick the cheapest adequate model of the tier table for a node call.
+
+    Without `model_routing` the node's configured model is used unchanged.
+
+    Args:
+        node: The node making the call, for the routing log.
+        state: The graph state of the node.
+        configurable: The agent configuration, holding the tier table.
+        default_model: The model used when routing is disabled.
+        research: Whether the message is answered with web research, `None` if unknown.
+        heavy_model: Replaces the heavy tier model, e.g. a `reasoning_model` set in state.
+    """
+    if not configurable.model_routing:
+        return default_model
+
+    signals = routing_signals(state, configurable, research)
+    score = complexity_score(signals)
+    tier = score_tier(score, configurable)
+    models = {
+        "light": configurable.light_model,
+        "standard": configurable.standard_model,
+        "heavy": heavy_model or configurable.heavy_model,
+    }
+    logger.info(
+        "Routing %s to %s (%s tier, score %.2f)",
+        node,
+        models[tier],
+        tier,
+        score,
+        extra={"node": node, "model": models[tier], "tier": tier, "score": score, "signals": signals},
+    )
+    return models[tier]
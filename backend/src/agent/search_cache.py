@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from src.agent.utils import normalize_query
+
+
+# Bumped whenever the key changes, so entries under an older key are never served
+CACHE_KEY_VERSION = 2
+
+
+def cache_key(model: str, query: str) -> str:
+    """Key of a search, equal for queries that only differ in case, punctuation or whitespace."""
+    return hashlib.sha256(
+        f"{CACHE_KEY_VERSION}\n{model}\n{normalize_query(query)}".encode()
+    ).hexdigest()
+
+
+def serialize_search_response(response) -> dict[str, Any]:
+    """Keep the parts of a grounded response used by `resolve_urls` and `get_citations`."""
+    candidate = response.candidates[0]
+    metadata = candidate.grounding_metadata
+    chunks = []
+    for chunk in (metadata.grounding_chunks or []) if metadata else []:
+        web = getattr(chunk, "web", None)
+        chunks.append({
+            "uri": getattr(web, "uri", None),
+            "title": getattr(web, "title", None),
+        })
+    supports = []
+    for support in (getattr(metadata, "grounding_supports", None) or []) if metadata else []:
+        segment = getattr(support, "segment", None)
+        supports.append({
+            "start_index": getattr(segment, "start_index", None),
+            "end_index": getattr(segment, "end_index", None),
+            "chunk_indices": list(getattr(support, "grounding_chunk_indices", None) or []),
+        } if segment is not None else None)
+    return {"text": response.text, "chunks": chunks, "supports": supports}
+
+
+def deserialize_search_response(payload: dict[str, Any]) -> SimpleNamespace:
+    """Rebuild a response object shaped like the genai response from a cached payload.
+
+    The short urls and citations are computed again from it, so a cached result
+    is numbered for the branch that uses it.
+    """
+    chunks = [
+        SimpleNamespace(web=SimpleNamespace(uri=chunk["uri"], title=chunk["title"]))
+        for chunk in payload["chunks"]
+    ]
+    supports = [
+        SimpleNamespace(
+            segment=SimpleNamespace(
+                start_index=support["start_index"], end_index=support["end_index"]
+            ),
+            grounding_chunk_indices=support["chunk_indices"],
+        )
+        if support is not None
+        else SimpleNamespace(segment=None, grounding_chunk_indices=None)
+        for support in payload["supports"]
+    ]
+    metadata = SimpleNamespace(grounding_chunks=chunks, grounding_supports=supports)
+    return SimpleNamespace(
+        text=payload["text"],
+        candidates=[SimpleNamespace(grounding_metadata=metadata)],
+        usage_metadata=None,
+    )
+
+
+class SearchCache(ABC):
+    """Size-bounded LRU cache of grounded search results with a TTL."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    @abstractmethod
+    def _get_payload(self, key: str) -> Optional[dict[str, Any]]:
+        """Return the payload stored under `key`, `None` when missing or expired."""
+
+    @abstractmethod
+    def _put_payload(self, key: str, payload: dict[str, Any]) -> None:
+        """Store the payload under `key`, evicting the least recently used entries over `max_entries`."""
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def get(self, model: str, query: str) -> Optional[SimpleNamespace]:
+        """Return the cached response for the query, `None` on a miss."""
+        payload = self._get_payload(cache_key(model, query))
+        return deserialize_search_response(payload) if payload is not None else None
+
+    def put(self, model: str, query: str, response) -> None:
+        self._put_payload(cache_key(model, query), serialize_search_response(response))
+
+    async def aget(self, model: str, query: str) -> Optional[SimpleNamespace]:
+        return self.get(model, query)
+
+    async def aput(self, model: str, query: str, response) -> None:
+        self.put(model, query, response)
+
+
+class MemorySearchCache(SearchCache):
+    """Process-local cache, shared by every run of the worker."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        super().__init__(ttl_seconds, max_entries)
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_payload(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, payload = entry
+            if self._expired(created_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def _put_payload(self, key, payload):
+        with self._lock:
+            self._entries[key] = (time.time(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SqliteSearchCache(SearchCache):
+    """Cache kept in a local SQLite file, survives restarts and is shared by the workers of a host."""
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        super().__init__(ttl_seconds, max_entries)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache (last_used_at)"
+            )
+
+    def _get_payload(self, key):
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT payload, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, created_at = row
+            if self._expired(created_at):
+                self._connection.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE search_cache SET last_used_at = ? WHERE key = ?", (time.time(), key)
+            )
+            return json.loads(payload)
+
+    def _put_payload(self, key, payload):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO search_cache (key, payload, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), now, now),
+            )
+            self._connection.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                "SELECT key FROM search_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def aget(self, model, query):
+        return await asyncio.to_thread(self.get, model, query)
+
+    async def aput(self, model, query, response):
+        await asyncio.to_thread(self.put, model, query, response)
+
+
+_caches: dict[tuple, SearchCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_search_cache(configurable) -> Optional[SearchCache]:
+    """Return the search cache selected by the configuration, `None` when disabled."""
+    backend = configurable.search_cache
+    if backend == "none":
+        return None
+    key = (
+        backend,
+        configurable.search_cache_path,
+        configurable.search_cache_ttl_seconds,
+        configurable.search_cache_max_entries,
+    )
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            if backend == "memory":
+                cache = MemorySearchCache(
+                    configurable.search_cache_ttl_seconds,
+                    configurable.search_cache_max_entries,
+                )
+            elif backend == "sqlite":
+                cache = SqliteSearchCache(
+                    configurable.search_cache_path,
+                    configurable.search_cache_ttl_seconds,
+                    configurable.search_cache_max_entries,
+                )
+            else:
+                raise ValueError(f"Unknown search cache backend: {backend}")
+            _caches[key] = cache
+        return cache
@@ -0,0 +1,107 @@
+"""Run-level registry of the source urls cited by the web research branches.
+
+Every original url gets one short id derived from the url itself, so parallel
+branches and later loops give the same url the same short url without
+coordinating. The state keeps each url once in `source_registry`, and the
+branches only add the short ids they cite to `source_ids`.
+
+Within a search result, a url whose short id is already taken by another url
+gets a longer id. Branches can't see each other's urls, so a collision between
+branches can't be resolved: the registry keeps the first url and logs an error.
+"""
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+SHORT_URL_PREFIX = "https://vertexaisearch.cloud.google.com/id/"
+
+# 16 hex digits: a collision is about one in thirty million for a million urls
+SHORT_ID_LENGTH = 16
+
+# Hex digits added to a short id taken by another url
+SHORT_ID_EXTENSION = 4
+
+# (original url, label) of a short id
+Source = Tuple[str, str]
+
+
+def short_id(url: str, length: Optional[int] = None) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:length or SHORT_ID_LENGTH]
+
+
+def assign_short_ids(urls: Iterable[str]) -> Dict[str, str]:
+    """The short id of each url, extended while it is taken by another of the urls."""
+    ids: Dict[str, str] = {}
+    taken = set()
+    for url in urls:
+        if url in ids:
+            continue
+        length = SHORT_ID_LENGTH
+        key = short_id(url, length)
+        while key in taken:
+            length += SHORT_ID_EXTENSION
+            key = short_id(url, length)
+        ids[url] = key
+        taken.add(key)
+    return ids
+
+
+def short_url(url: str) -> str:
+    """The short url a long source url is replaced with in prompts, to save tokens."""
+    return SHORT_URL_PREFIX + short_id(url)
+
+
+def merge_source_registry(
+    left: Optional[Dict[str, Source]], right: Optional[Dict[str, Source]]
+) -> Dict[str, Source]:
+    """Reducer of `source_registry`, the first url registered under a short id wins."""
+    # Checkpoints give the tuples back as lists
+    merged = {key: tuple(source) for key, source in (left or {}).items()}
+    for key, source in (right or {}).items():
+        kept = merged.setdefault(key, tuple(source))
+        if kept[0] != source[0]:
+            # The text citing the second url already holds the short url, it resolves to the first
+            logger.error(
+                "Short id %s collision: %s is cited as %s",
+                key,
+                source[0],
+                kept[0],
+                extra={"short_id": key, "url": source[0], "registered_url": kept[0]},
+            )
+    return merged
+
+
+def register_citations(citations: List[dict]) -> Dict[str, Source]:
+    """Intern the sources cited by `get_citations`, in the order they are first cited.
+
+    The sources are registered under the short ids `resolve_urls` gave them in the text.
+    """
+    registry = {}
+    for citation in citations:
+        for segment in citation["segments"]:
+            cited_url = segment["short_url"] or ""
+            key = (
+                cited_url[len(SHORT_URL_PREFIX):]
+                if cited_url.startswith(SHORT_URL_PREFIX)
+                else short_id(segment["value"])
+            )
+            registry.setdefault(key, (segment["value"], segment["label"]))
+    return registry
+
+
+def source_list(registry: Dict[str, Source], short_ids: Optional[Iterable[str]] = None) -> List[dict]:
+    """The deduplicated sources as `label`, `short_url` and `value` (original url) dicts.
+
+    Args:
+        registry: The `source_registry` of the run.
+        short_ids: The short ids to list, in order, every registered source by default.
+    """
+    keys = registry if short_ids is None else dict.fromkeys(short_ids)
+    return [
+        {"label": registry[key][1], "short_url": SHORT_URL_PREFIX + key, "value": registry[key][0]}
+        for key in keys
+        if key in registry
+    ]
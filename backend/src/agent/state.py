@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import TypedDict
+from typing import Optional, TypedDict
 
 from langgraph.graph import add_messages
+
+from src.agent.budget import add_run_usage
+from src.agent.sources import merge_source_registry
 from typing_extensions import Annotated
 
 
@@ -12,21 +15,34 @@ import operator
 
 class OverallState(TypedDict):
     messages: Annotated[list, add_messages]
+    query_list: list
     search_query: Annotated[list, operator.add]
+    skipped_query_count: Annotated[int, operator.add]
     web_research_result: Annotated[list, operator.add]
+    source_registry: Annotated[dict, merge_source_registry]
+    source_ids: Annotated[list, operator.add]
     sources_gathered: Annotated[list, operator.add]
     initial_search_query_count: int
     max_research_loops: int
     research_loop_count: int
     reasoning_model: str
+    memory_snapshot: Optional[list]
+    research_gain: Annotated[list, operator.add]
+    run_usage: Annotated[Optional[dict], add_run_usage]
+    last_memorized_message_id: Optional[str]
+    memorized_research_count: int
 
 
 class ReflectionState(TypedDict):
     is_sufficient: bool
     knowledge_gap: str
-    follow_up_queries: Annotated[list, operator.add]
+    follow_up_queries: list
     research_loop_count: int
+    max_research_loops: int
     number_of_ran_queries: int
+    memory_snapshot: Optional[list]
+    research_gain: Annotated[list, operator.add]
+    run_usage: Annotated[Optional[dict], add_run_usage]
 
 
 class Query(TypedDict):
@@ -35,12 +51,15 @@ class Query(TypedDict):
 
 
 class QueryGenerationState(TypedDict):
-    search_query: list[Query]
+    query_list: list[str]
+    memory_snapshot: Optional[list]
+    run_usage: Annotated[Optional[dict], add_run_usage]
 
 
 class WebSearchState(TypedDict):
     search_query: str
     id: str
+    memory_snapshot: Optional[list]
 
 
 @dataclass(kw_only=True)
@@ -30,3 +30,19 @@ class Intention(BaseModel):
             "finalize_answer"
         ]
     )
+
+
+class IntentionAndQueries(BaseModel):
+    intention: str = Field(
+        description="The user's intention for the last message, either 'web_research' or 'finalize_answer'.",
+        examples=[
+            "web_research",
+            "finalize_answer"
+        ]
+    )
+    query: List[str] = Field(
+        description="A list of search queries to be used for web research, empty when the intention is 'finalize_answer'."
+    )
+    rationale: str = Field(
+        description="A brief explanation of why these queries are relevant to the research topic."
+    )
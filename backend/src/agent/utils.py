@@ -1,46 +1,285 @@
 import json
 import os
+import re
+import threading
 
-from typing import Any, Dict, List
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.types import Send
 
+from src.agent.clients import get_chat_model
+from src.agent.prompts import conversation_summary_instructions
+from src.agent.sources import SHORT_URL_PREFIX, Source, assign_short_ids, source_list
 from src.agent.tools_and_schemas import Intention
 
 
-def get_research_topic(messages: List[AnyMessage]) -> str:
+# Rendered transcripts by thread, keyed by the id of the thread's first message.
+# Messages are append-only, so each call only renders the messages added since
+# the previous one. Transcripts are only read and written under the lock, the
+# summary model is called without it.
+MAX_CACHED_TRANSCRIPTS = 1024
+TOPIC_SUMMARY_MAX_WORDS = 200
+
+
+class _Transcript:
+    def __init__(self):
+        self.ids: list[str] = []
+        self.lines: list[str] = []
+        self.human_indices: list[int] = []
+        # Rolling summary of lines[:summarized_upto] by summary_model, only used when windowed
+        self.summary = ""
+        self.summarized_upto = 0
+        self.summary_model: Optional[str] = None
+        self.topic_key: tuple = ()
+        self.topic = ""
+
+
+@dataclass
+class _TopicPlan:
+    """The memoized topic, or what is needed to build it once the summary is written."""
+    key: tuple
+    ids: list[str]
+    start: int = 0
+    recent: list[str] = field(default_factory=list)
+    summary_prompt: Optional[str] = None
+    topic: Optional[str] = None
+
+
+_transcripts: OrderedDict[str, _Transcript] = OrderedDict()
+_transcripts_lock = threading.Lock()
+
+
+def _render_message(message: AnyMessage) -> str:
+    if isinstance(message, HumanMessage):
+        return f"User: {message.content}\n"
+    if isinstance(message, AIMessage):
+        return f"Assistant: {message.content}\n"
+    return ""
+
+
+def render_transcript(messages: List[AnyMessage]) -> str:
+    """Render the user and assistant messages as `User: ...` / `Assistant: ...` lines."""
+    return "".join(_render_message(message) for message in messages)
+
+
+def _extend_transcript(transcript: _Transcript, messages: List[AnyMessage]) -> None:
+    ids = [message.id for message in messages]
+    if ids[:len(transcript.ids)] != transcript.ids:
+        # The history was edited or replaced, start over
+        transcript.__init__()
+    for index in range(len(transcript.ids), len(messages)):
+        transcript.lines.append(_render_message(messages[index]))
+        if isinstance(messages[index], HumanMessage):
+            transcript.human_indices.append(index)
+    transcript.ids = ids
+
+
+def _get_transcript(messages: List[AnyMessage]) -> _Transcript:
+    """Return the up to date transcript of the thread, `_transcripts_lock` must be held."""
+    transcript = _transcripts.get(messages[0].id)
+    if transcript is None:
+        transcript = _Transcript()
+        _transcripts[messages[0].id] = transcript
+    _transcripts.move_to_end(messages[0].id)
+    while len(_transcripts) > MAX_CACHED_TRANSCRIPTS:
+        _transcripts.popitem(last=False)
+    _extend_transcript(transcript, messages)
+    return transcript
+
+
+def _window_start(transcript: _Transcript, max_turns: int) -> int:
+    """Index of the first message of the last `max_turns` turns, 0 when not windowed."""
+    if not max_turns or len(transcript.human_indices) <= max_turns:
+        return 0
+    return transcript.human_indices[-max_turns]
+
+
+def _windowed_topic(summary: Optional[str], recent: List[str]) -> str:
+    if summary is None:
+        return "".join(recent)
+    return f"Summary of the earlier conversation: {summary}\n{''.join(recent)}"
+
+
+def _plan_topic(messages: List[AnyMessage], max_turns: int, model: Optional[str]) -> _TopicPlan:
+    with _transcripts_lock:
+        transcript = _get_transcript(messages)
+        plan = _TopicPlan(key=(transcript.ids[-1], max_turns, model), ids=transcript.ids)
+        if transcript.topic_key == plan.key:
+            plan.topic = transcript.topic
+            return plan
+
+        plan.start = _window_start(transcript, max_turns)
+        plan.recent = transcript.lines[plan.start:]
+        if not plan.start:
+            plan.topic = _windowed_topic(None, plan.recent)
+        elif transcript.summarized_upto != plan.start or transcript.summary_model != model:
+            # Roll the turns that left the window into the summary. When the window
+            # grew or the model changed, summarize the older turns again.
+            resume = transcript.summarized_upto < plan.start and transcript.summary_model == model
+            summary, summarized_upto = (transcript.summary, transcript.summarized_upto) if resume else ("", 0)
+            plan.summary_prompt = conversation_summary_instructions.format(
+                max_words=TOPIC_SUMMARY_MAX_WORDS,
+                summary=summary or "(none)",
+                conversation="".join(transcript.lines[summarized_upto:plan.start]),
+            )
+            return plan
+        else:
+            plan.topic = _windowed_topic(transcript.summary, plan.recent)
+        transcript.topic_key, transcript.topic = plan.key, plan.topic
+        return plan
+
+
+def _finish_topic(plan: _TopicPlan, model: str, summary: str) -> str:
+    topic = _windowed_topic(summary, plan.recent)
+    with _transcripts_lock:
+        transcript = _transcripts.get(plan.ids[0])
+        # Another call may have replaced the history while the summary was written
+        if transcript is not None and transcript.ids[:plan.start] == plan.ids[:plan.start]:
+            transcript.summary, transcript.summarized_upto = summary, plan.start
+            transcript.summary_model = model
+            if transcript.ids == plan.ids:
+                transcript.topic_key, transcript.topic = plan.key, topic
+    return topic
+
+
+def _check_topic_model(max_turns: int, model: Optional[str]) -> None:
+    if max_turns and model is None:
+        raise ValueError("A model is required to summarize the turns older than max_turns")
+
+
+def get_research_topic(
+    messages: List[AnyMessage],
+    max_turns: int = 0,
+    model: Optional[str] = None,
+) -> str:
     """
     Get the research topic from the messages.
+
+    The transcript of a thread is memoized by message id and extended with the new
+    messages only. With `max_turns`, only the last turns are kept verbatim and the
+    older ones are folded into a rolling summary written by `model`, which is then
+    required. The topic is memoized by last message id, `max_turns` and `model`.
     """
     # check if request has a history and combine the messages into a single string
     if len(messages) == 1:
-        research_topic = messages[-1].content
-    else:
-        research_topic = ""
-        for message in messages:
-            if isinstance(message, HumanMessage):
-                research_topic += f"User: {message.content}\n"
-            elif isinstance(message, AIMessage):
-                research_topic += f"Assistant: {message.content}\n"
-    return research_topic
+        return messages[-1].content
+    _check_topic_model(max_turns, model)
+    if any(message.id is None for message in messages):
+        return render_transcript(messages)
+
+    plan = _plan_topic(messages, max_turns, model)
+    if plan.summary_prompt is None:
+        return plan.topic
+    summary = get_chat_model(model, temperature=0).invoke(plan.summary_prompt)
+    return _finish_topic(plan, model, summary.content)
+
+
+async def aget_research_topic(
+    messages: List[AnyMessage],
+    max_turns: int = 0,
+    model: Optional[str] = None,
+) -> str:
+    """
+    Async version of `get_research_topic`.
+    """
+    if len(messages) == 1:
+        return messages[-1].content
+    _check_topic_model(max_turns, model)
+    if any(message.id is None for message in messages):
+        return render_transcript(messages)
 
+    plan = _plan_topic(messages, max_turns, model)
+    if plan.summary_prompt is None:
+        return plan.topic
+    summary = await get_chat_model(model, temperature=0).ainvoke(plan.summary_prompt)
+    return _finish_topic(plan, model, summary.content)
 
-def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def text_tokens(text: str) -> set[str]:
     """
-    Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
-    Ensures each original URL gets a consistent shortened form while maintaining uniqueness.
+    Lower-cased set of word tokens of a text, used for cheap lexical matching.
+    """
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+def lexical_overlap(query_tokens: set[str], text: str) -> float:
+    """
+    Fraction of the query tokens that appear in the text.
+    """
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & text_tokens(text)) / len(query_tokens)
+
+
+def jaccard_similarity(left_tokens: set[str], right_tokens: set[str]) -> float:
+    """
+    Jaccard similarity of two token sets, 1.0 for identical sets.
+    """
+    if not left_tokens and not right_tokens:
+        return 1.0
+    return len(left_tokens & right_tokens) / len(left_tokens | right_tokens)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so that queries differing only in case, punctuation or
+    whitespace compare equal. Word order is kept: reordered words can ask another question.
+    """
+    return " ".join(_TOKEN_RE.findall(query.lower()))
+
+
+def query_shingles(query: str, size: int = 3) -> set[str]:
+    """
+    Character shingles of the normalized query, in word order, tolerant to small wording changes.
+    """
+    normalized = normalize_query(query)
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def dedupe_queries(
+    candidates: List[str], existing: List[str], threshold: float
+) -> tuple[List[str], int]:
+    """
+    Drop the candidate queries that duplicate an existing query or an earlier candidate.
+
+    Exact duplicates (after normalization, same words in the same order) are always
+    dropped, near-duplicates when the Jaccard similarity of their shingles is at least
+    `threshold`.
+
+    Returns:
+        The kept queries, in their original order, and the number of skipped ones.
     """
-    prefix = f"https://vertexaisearch.cloud.google.com/id/"
-    urls = [site.web.uri for site in urls_to_resolve]
+    seen_normalized = {normalize_query(query) for query in existing}
+    seen_shingles = [query_shingles(query) for query in existing]
+    kept = []
+    for query in candidates:
+        normalized = normalize_query(query)
+        shingles = query_shingles(query)
+        if normalized in seen_normalized or any(
+            jaccard_similarity(shingles, other) >= threshold for other in seen_shingles
+        ):
+            continue
+        seen_normalized.add(normalized)
+        seen_shingles.append(shingles)
+        kept.append(query)
+    return kept, len(candidates) - len(kept)
 
-    # Create a dictionary that maps each unique URL to its first occurrence index
-    resolved_map = {}
-    for idx, url in enumerate(urls):
-        if url not in resolved_map:
-            resolved_map[url] = f"{prefix}{id}-{idx}"
 
-    return resolved_map
+def resolve_urls(urls_to_resolve: List[Any]) -> Dict[str, str]:
+    """
+    Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
+    The id is derived from the url, so every branch and loop of a run gives a url the same short url.
+    A url whose id is taken by another url of the result gets a longer id.
+    """
+    short_ids = assign_short_ids(site.web.uri for site in urls_to_resolve)
+    return {url: SHORT_URL_PREFIX + key for url, key in short_ids.items()}
 
 
 def insert_citation_markers(text, citations_list):
@@ -59,27 +298,114 @@ def insert_citation_markers(text, citations_list):
     """
     # Sort citations by end_index in descending order.
     # If end_index is the same, secondary sort by start_index descending.
-    # This ensures that insertions at the end of the string don't affect
-    # the indices of earlier parts of the string that still need to be processed.
+    # Walking this order backwards gives the markers in the order they end up
+    # in the text, so the output is built front to back in a single pass.
     sorted_citations = sorted(
         citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
     )
 
-    modified_text = text
-    for citation_info in sorted_citations:
-        # These indices refer to positions in the *original* text,
-        # but since we iterate from the end, they remain valid for insertion
-        # relative to the parts of the string already processed.
-        end_idx = citation_info["end_index"]
-        marker_to_insert = ""
+    pieces = []
+    cursor = 0
+    for citation_info in reversed(sorted_citations):
+        # These indices refer to positions in the *original* text
+        end_idx = min(max(citation_info["end_index"], cursor), len(text))
+        pieces.append(text[cursor:end_idx])
         for segment in citation_info["segments"]:
-            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
-        # Insert the citation marker at the original end_idx position
-        modified_text = (
-            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+            pieces.append(f" [{segment['label']}]({segment['short_url']})")
+        cursor = end_idx
+    pieces.append(text[cursor:])
+
+    return "".join(pieces)
+
+
+class ShortUrlRewriter:
+    """
+    Replace the short urls of a text with their original urls, in one go or as a
+    stream of chunks.
+
+    Longer short urls are matched first, so an id is never rewritten as a shorter
+    id it starts with. When streaming, the end of a chunk that could be the start
+    of a short url (or of a longer one) is held back until the next chunk tells
+    whether it is, a short url split across chunks is still rewritten.
+
+    Args:
+        registry: The `source_registry` of the run, short id to (original url, label).
+    """
+
+    def __init__(self, registry: Dict[str, Source]):
+        self._registry = registry
+        self._ids_by_short_url = {SHORT_URL_PREFIX + key: key for key in registry}
+        short_urls = sorted(self._ids_by_short_url, key=len, reverse=True)
+        self._pattern = (
+            re.compile("|".join(re.escape(short_url) for short_url in short_urls))
+            if short_urls
+            else None
         )
+        self._prefixes = {
+            short_url[:size] for short_url in short_urls for size in range(1, len(short_url) + 1)
+        }
+        self._max_length = len(short_urls[0]) if short_urls else 0
+        self._used_ids = set()
+        self._pending = ""
+
+    def _original_url(self, match: re.Match) -> str:
+        key = self._ids_by_short_url[match.group(0)]
+        self._used_ids.add(key)
+        return self._registry[key][0]
+
+    def rewrite(self, text: str) -> str:
+        """Rewrite a complete text."""
+        if self._pattern is None:
+            return text
+        return self._pattern.sub(self._original_url, text)
+
+    def _safe_length(self, text: str) -> int:
+        """Length of the start of `text` that no later chunk can change."""
+        for start in range(max(len(text) - self._max_length, 0), len(text)):
+            if text[start:] in self._prefixes:
+                break
+        else:
+            return len(text)
+        # Never cut a short url found before the held back tail
+        for match in self._pattern.finditer(text, max(start - self._max_length, 0)):
+            if match.start() < start < match.end():
+                return match.start()
+        return start
+
+    def feed(self, chunk: str) -> str:
+        """Rewrite the next chunk of a stream, returns the text safe to emit so far."""
+        if self._pattern is None:
+            return chunk
+        text = self._pending + chunk
+        safe_length = self._safe_length(text)
+        self._pending = text[safe_length:]
+        return self.rewrite(text[:safe_length])
+
+    def flush(self) -> str:
+        """Rewrite and return the text held back at the end of the stream."""
+        text, self._pending = self._pending, ""
+        return self.rewrite(text)
+
+    def used_sources(self) -> List[Dict[str, Any]]:
+        """The deduplicated sources whose short url was rewritten so far, in the order of the registry."""
+        return source_list(self._registry, [key for key in self._registry if key in self._used_ids])
+
+
+def replace_short_urls(text: str, registry: Dict[str, Source]) -> tuple[str, List[Dict[str, Any]]]:
+    """
+    Replace the short urls in a text with their original urls in a single pass.
 
-    return modified_text
+    Args:
+        text: The text containing short urls.
+        registry: The `source_registry` of the run, short id to (original url, label).
+
+    Returns:
+        The rewritten text and the deduplicated sources whose short url appeared in
+        it, as `label`, `short_url` and `value` dicts in the order of the registry.
+    """
+    rewriter = ShortUrlRewriter(registry)
+    text = rewriter.rewrite(text)
+    return text, rewriter.used_sources()
 
 
 def get_citations(response, resolved_urls_map):
@@ -179,17 +505,20 @@ def parse_json_from_response(response):
         raise ValueError("Failed to parse JSON from response")
 
 
+def _intention_messages(message: HumanMessage) -> list[AnyMessage]:
+    return [
+        SystemMessage("Return a JSON with the intention of the user's message. Can be either 'web_research' or 'finalize_answer'. The JSON should be in this format: `{\"intention\": \"web_research\"}`."),
+        message
+    ]
+
+
 def get_message_intention(message: HumanMessage) -> Intention:
-    llm = ChatGoogleGenerativeAI(
-        model='gemini-2.5-flash',
-        temperature=0.1,
-        max_retries=2,
-        api_key=os.getenv('GEMINI_API_KEY')
-    )
+    structured_llm = get_chat_model('gemini-2.5-flash', temperature=0.1, schema=Intention)
 
-    structured_llm = llm.with_structured_output(Intention)
+    return structured_llm.invoke(_intention_messages(message))
 
-    return structured_llm.invoke([
-        SystemMessage("Return a JSON with the intention of the user's message. Can be either 'web_research' or 'finalize_answer'. The JSON should be in this format: `{\"intention\": \"web_research\"}`."),
-        message
-    ])
+
+async def aget_message_intention(message: HumanMessage) -> Intention:
+    structured_llm = get_chat_model('gemini-2.5-flash', temperature=0.1, schema=Intention)
+
+    return await structured_llm.ainvoke(_intention_messages(message))
@@ -0,0 +1,64 @@
+"""Build the clients of the graph ahead of the first request.
+
+Importing the graph no longer imports the Gemini SDKs nor builds a client, so
+a worker boots fast. The first run would pay for it instead: SDK imports,
+client construction and the conversion of the structured output schemas.
+`warm_up` does that work at server start, `app.py` runs it when the
+AGENT_WARM_UP environment variable is set.
+"""
+import time
+from typing import Any, Optional
+
+from src.agent.clients import get_chat_model, get_client_stats, get_genai_client
+from src.agent.configuration import Configuration
+from src.agent.routing import TIERS
+from src.agent.tools_and_schemas import (
+    Intention,
+    IntentionAndQueries,
+    Reflection,
+    SearchQueryList,
+)
+
+
+def _chat_model_specs(configurable: Configuration) -> list[tuple[str, float, Optional[type], Optional[str]]]:
+    # Same (model, temperature, schema) combinations as the nodes ask for
+    query_models = [configurable.query_generator_model]
+    reflection_models = [configurable.reflection_model]
+    answer_models = [configurable.answer_model, configurable.budget_answer_model]
+    if configurable.model_routing:
+        tier_models = [getattr(configurable, f"{tier}_model") for tier in TIERS]
+        query_models += tier_models
+        reflection_models += tier_models
+        answer_models += tier_models
+    # Cached prompts switch the structured output to json mode
+    methods = [None] if configurable.prompt_cache == "none" else [None, "json_mode"]
+
+    specs = [("gemini-2.5-flash", 0.1, Intention, None)]
+    for model in dict.fromkeys(query_models):
+        specs.append((model, 1.0, None, None))
+        for method in methods:
+            specs += [(model, 1.0, SearchQueryList, method), (model, 1.0, IntentionAndQueries, method)]
+    for model in dict.fromkeys(reflection_models):
+        specs += [(model, 1.0, Reflection, method) for method in methods]
+    for model in dict.fromkeys(answer_models + [configurable.query_generator_model]):
+        specs.append((model, 0, None, None))
+    return specs
+
+
+def warm_up(configurable: Optional[Configuration] = None) -> dict[str, Any]:
+    """Build the chat models, structured output variants and search client the graph uses.
+
+    Nothing is sent to the provider.
+
+    Args:
+        configurable: Configuration the models are picked from, the environment's by default.
+
+    Returns:
+        The seconds spent and the client registry stats after the warm-up.
+    """
+    configurable = configurable or Configuration.from_runnable_config()
+    started_at = time.perf_counter()
+    for model, temperature, schema, method in _chat_model_specs(configurable):
+        get_chat_model(model, temperature, schema=schema, method=method)
+    get_genai_client()
+    return {"seconds": round(time.perf_counter() - started_at, 3), **get_client_stats()}
@@ -0,0 +1,10 @@
+import pytest
+
+from src.agent.clients import set_client_factories
+
+
+@pytest.fixture
+def restore_clients():
+    """Put the Gemini client factories back after a test that installs the benchmark fakes."""
+    yield
+    set_client_factories()
@@ -0,0 +1,89 @@
+"""Batch runs: per-question settings and resuming from the output file."""
+import json
+
+from langchain_core.messages import AIMessage
+from langgraph.store.memory import InMemoryStore
+
+from benchmarks.graph_benchmark import install_fakes, parse_args
+from src.agent.batch import default_errors_path, run_batch
+from src.agent.graph import builder
+
+
+class RecordingGraph:
+    """Wraps a graph and keeps the final state of every run by question."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.results = {}
+
+    async def ainvoke(self, state, config):
+        result = await self.graph.ainvoke(state, config)
+        self.results[state["messages"][-1].content] = result
+        return result
+
+
+class FlakyGraph:
+    """Answers every question, except those in `failing` which raise."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    async def ainvoke(self, state, config):
+        question = state["messages"][-1].content
+        self.calls.append(question)
+        if question in self.failing:
+            raise RuntimeError(f"{question} failed")
+        return {"messages": [AIMessage(content=f"answer to {question}")], "sources_gathered": []}
+
+
+def _records(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_per_question_loop_limit_reaches_the_run(tmp_path, restore_clients):
+    # Reflection is never satisfied, the loop limit stops the research
+    install_fakes(parse_args(["--llm-latency-ms", "0", "--search-latency-ms", "0", "--follow-up-loops", "10"]))
+    graph = RecordingGraph(builder.compile(store=InMemoryStore()))
+    questions = [
+        {"question": "one loop", "max_research_loops": 1, "initial_search_query_count": 1},
+        {"question": "three loops", "max_research_loops": 3, "initial_search_query_count": 1},
+    ]
+
+    report = run_batch(questions, str(tmp_path / "results.jsonl"), graph=graph)
+
+    assert report.succeeded == 2
+    assert graph.results["one loop"]["research_loop_count"] == 1
+    assert graph.results["three loops"]["research_loop_count"] == 3
+
+
+def test_resume_skips_answered_questions_and_retries_failed_ones(tmp_path):
+    output_path = str(tmp_path / "results.jsonl")
+    questions = ["a", "b", "c"]
+
+    first = FlakyGraph(failing={"b"})
+    first_report = run_batch(questions, output_path, graph=first)
+    second = FlakyGraph()
+    second_report = run_batch(questions, output_path, graph=second)
+
+    assert (first_report.succeeded, first_report.failed) == (2, 1)
+    assert sorted(first.calls) == ["a", "b", "c"]
+    assert second.calls == ["b"]
+    assert (second_report.succeeded, second_report.skipped) == (1, 2)
+    # One record per id in the output file, the failed attempt in the errors file
+    records = _records(output_path)
+    assert sorted(record["id"] for record in records) == ["0", "1", "2"]
+    assert all(record["error"] is None for record in records)
+    assert [record["id"] for record in _records(default_errors_path(output_path))] == ["1"]
+
+
+def test_resume_ignores_a_partially_written_last_line(tmp_path):
+    output_path = tmp_path / "results.jsonl"
+    output_path.write_text(json.dumps({"id": "0", "answer": "kept", "error": None}) + '\n{"id": "1", "ans')
+
+    graph = FlakyGraph()
+    run_batch(["a", "b"], str(output_path), graph=graph)
+
+    assert graph.calls == ["b"]
+    assert [record["id"] for record in _records(output_path)] == ["0", "1"]
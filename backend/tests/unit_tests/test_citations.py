@@ -0,0 +1,134 @@
+"""Citation markers and short url rewrites against the implementations they replaced."""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from src.agent.sources import SHORT_URL_PREFIX, short_url
+from src.agent.utils import insert_citation_markers, replace_short_urls, resolve_urls
+
+
+def _old_insert_citation_markers(text, citations_list):
+    sorted_citations = sorted(
+        citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
+    )
+    modified_text = text
+    for citation_info in sorted_citations:
+        end_idx = citation_info["end_index"]
+        marker_to_insert = ""
+        for segment in citation_info["segments"]:
+            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
+        modified_text = modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+    return modified_text
+
+
+def _old_replace_short_urls(text, sources_gathered):
+    unique_sources = []
+    for source in sources_gathered:
+        if source["short_url"] in text:
+            text = text.replace(source["short_url"], source["value"])
+            unique_sources.append(source)
+    return text, unique_sources
+
+
+def _segment(number):
+    return {"label": f"site{number}", "short_url": f"{SHORT_URL_PREFIX}{number}", "value": f"https://site{number}.com/page"}
+
+
+def _citation(start_index, end_index, *numbers):
+    return {"start_index": start_index, "end_index": end_index, "segments": [_segment(number) for number in numbers]}
+
+
+TEXT = "Paris is the capital of France. It has 2.1 million inhabitants. Ça va, très bien."
+
+CITATION_CASES = {
+    "none": [],
+    "single": [_citation(0, 31, 1)],
+    "several segments": [_citation(0, 31, 1, 2, 3)],
+    "equal end offsets": [_citation(0, 31, 1), _citation(10, 31, 2), _citation(5, 31, 3)],
+    "equal start and end offsets": [_citation(0, 31, 1), _citation(0, 31, 2)],
+    "overlapping segments": [_citation(0, 63, 1), _citation(32, 45, 2), _citation(20, 40, 3)],
+    "at the edges": [_citation(0, 0, 1), _citation(0, len(TEXT), 2)],
+    "unordered": [_citation(32, 63, 2), _citation(0, 31, 1), _citation(64, 80, 3)],
+    "no segments": [_citation(0, 31)],
+}
+
+
+def _random_corpus(size=300, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        text = "".join(rng.choice("abc .,é\n") for _ in range(rng.randint(0, 120)))
+        citations = []
+        for _ in range(rng.randint(0, 8)):
+            end_index = rng.randint(0, len(text))
+            numbers = [rng.randint(1, 12) for _ in range(rng.randint(0, 3))]
+            citations.append(_citation(rng.randint(0, end_index), end_index, *numbers))
+        corpus.append((text, citations))
+    return corpus
+
+
+@pytest.mark.parametrize("citations", CITATION_CASES.values(), ids=CITATION_CASES.keys())
+def test_insert_citation_markers_matches_old_implementation(citations):
+    assert insert_citation_markers(TEXT, citations) == _old_insert_citation_markers(TEXT, citations)
+
+
+def test_insert_citation_markers_matches_old_implementation_on_random_corpus():
+    for text, citations in _random_corpus():
+        assert insert_citation_markers(text, citations) == _old_insert_citation_markers(text, citations)
+
+
+def test_insert_citation_markers_appends_markers_past_the_end():
+    # The old implementation inserted the second marker inside the first one
+    citations = [_citation(60, len(TEXT) + 10, 1), _citation(0, len(TEXT) + 3, 2)]
+
+    assert insert_citation_markers(TEXT, citations) == (
+        TEXT + f" [site2]({SHORT_URL_PREFIX}2) [site1]({SHORT_URL_PREFIX}1)"
+    )
+
+
+def test_resolve_urls_gives_each_url_one_short_url():
+    urls = ["https://a.com/1", "https://b.com/2", "https://a.com/1", "https://c.com/3"]
+    sites = [SimpleNamespace(web=SimpleNamespace(uri=url)) for url in urls]
+
+    resolved = resolve_urls(sites)
+
+    # Same urls, in first occurrence order, as the old per-run numbering
+    assert list(resolved) == list(dict.fromkeys(urls))
+    assert len(set(resolved.values())) == len(resolved)
+    assert all(resolved[url] == short_url(url) for url in urls)
+    assert resolve_urls(sites[::-1]) == resolved
+
+
+def _registry(urls):
+    return {short_url(url)[len(SHORT_URL_PREFIX):]: (url, f"label{index}") for index, url in enumerate(urls)}
+
+
+def _sources(registry):
+    return [
+        {"label": label, "short_url": SHORT_URL_PREFIX + key, "value": url}
+        for key, (url, label) in registry.items()
+    ]
+
+
+def test_replace_short_urls_matches_old_implementation_on_random_corpus():
+    rng = random.Random(1)
+    for _ in range(300):
+        registry = _registry([f"https://site{rng.randint(0, 30)}.com/{index}" for index in range(rng.randint(0, 10))])
+        short_urls = [SHORT_URL_PREFIX + key for key in registry]
+        words = ["see", "and", ".", "\n", SHORT_URL_PREFIX, SHORT_URL_PREFIX + "0"] + short_urls
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(0, 30)))
+
+        assert replace_short_urls(text, registry) == _old_replace_short_urls(text, _sources(registry))
+
+
+def test_replace_short_urls_does_not_rewrite_an_id_as_its_prefix():
+    # The old loop rewrote the start of 1-10 as 1-1 when 1-1 came first
+    registry = {"1-1": ("https://one.com", "one"), "1-10": ("https://ten.com", "ten")}
+    text = f"[ten]({SHORT_URL_PREFIX}1-10) and [one]({SHORT_URL_PREFIX}1-1)."
+
+    rewritten, sources = replace_short_urls(text, registry)
+
+    assert rewritten == "[ten](https://ten.com) and [one](https://one.com)."
+    assert [source["value"] for source in sources] == ["https://one.com", "https://ten.com"]
+    assert _old_replace_short_urls(text, _sources(registry))[0] != rewritten
@@ -0,0 +1,99 @@
+"""Merging and eviction of long-term memories against an in-memory store."""
+from datetime import datetime, timedelta, timezone
+
+from langgraph.store.memory import InMemoryStore
+
+from src.agent.memory.consolidation import NAMESPACE, consolidate_memories, consolidate_user
+
+NOW = datetime.now(timezone.utc)
+
+
+def _store(memories, user_id="user"):
+    """A store with the given (key, content, days since last written) memories."""
+    store = InMemoryStore()
+    for key, content, age_days in memories:
+        last_written_at = (NOW - timedelta(days=age_days)).isoformat()
+        store.put((NAMESPACE, user_id), key, {"content": content, "last_written_at": last_written_at})
+    return store
+
+
+def _memories(store, user_id="user"):
+    return {item.key: item.value for item in store.search((NAMESPACE, user_id), limit=100)}
+
+
+def test_duplicates_merge_into_the_most_complete_memory():
+    store = _store([
+        ("short", "The user likes the history of Rome", 1),
+        ("long", "The user likes the history of ancient Rome", 30),
+        ("other", "The user lives in Lisbon", 5),
+    ])
+
+    report = consolidate_user(store, "user", threshold=0.7)
+
+    memories = _memories(store)
+    assert set(memories) == {"long", "other"}
+    assert memories["long"]["content"] == "The user likes the history of ancient Rome"
+    # The merged memory is as old as the latest write of its cluster
+    assert memories["long"]["last_written_at"] == (NOW - timedelta(days=1)).isoformat()
+    assert memories["long"]["merged_count"] == 2
+    assert (report.before, report.after, report.merged, report.evicted) == (3, 2, 1, 0)
+
+
+def test_merged_count_adds_up_over_runs():
+    store = _store([("first", "The user drinks green tea", 2), ("second", "The user drinks green tea", 3)])
+    consolidate_user(store, "user")
+    store.put((NAMESPACE, "user"), "third", {"content": "The user drinks green tea", "last_written_at": NOW.isoformat()})
+
+    consolidate_user(store, "user")
+
+    [memory] = _memories(store).values()
+    assert memory["merged_count"] == 3
+
+
+def test_eviction_keeps_the_most_recently_written():
+    store = _store([(f"memory{age}", f"Distinct fact number {age} {'x' * age}", age) for age in range(1, 6)])
+
+    report = consolidate_user(store, "user", max_memories=3)
+
+    assert set(_memories(store)) == {"memory1", "memory2", "memory3"}
+    assert (report.after, report.evicted) == (3, 2)
+
+
+def test_eviction_by_age():
+    store = _store([("recent", "The user cooks pasta", 10), ("stale", "The user owns a bicycle", 200)])
+
+    report = consolidate_user(store, "user", max_age_days=180)
+
+    assert set(_memories(store)) == {"recent"}
+    assert report.evicted == 1
+
+
+def test_merged_memory_is_evicted_by_its_latest_write():
+    store = _store([
+        ("old", "The user plays chess on weekends", 300),
+        ("older", "The user plays chess on the weekends", 400),
+        ("recent", "The user speaks French", 10),
+    ])
+
+    consolidate_user(store, "user", threshold=0.7, max_age_days=180)
+
+    assert set(_memories(store)) == {"recent"}
+
+
+def test_dry_run_writes_nothing():
+    store = _store([("a", "The user likes jazz", 1), ("b", "The user likes jazz", 2), ("c", "The user owns a cat", 400)])
+    before = _memories(store)
+
+    report = consolidate_user(store, "user", max_age_days=180, dry_run=True)
+
+    assert _memories(store) == before
+    assert (report.merged, report.evicted, report.after) == (1, 1, 1)
+
+
+def test_every_user_is_consolidated():
+    store = _store([("a", "The user likes jazz", 1), ("b", "The user likes jazz", 2)], user_id="one")
+    store.put((NAMESPACE, "two"), "c", {"content": "The user owns a cat"})
+
+    reports = consolidate_memories(store)
+
+    assert {report.user_id: report.after for report in reports} == {"one": 1, "two": 1}
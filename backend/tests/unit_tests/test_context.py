@@ -0,0 +1,53 @@
+"""Truncation of research results never leaves a partial citation marker."""
+import re
+
+import pytest
+
+from src.agent.context import CHARS_PER_TOKEN, _truncate
+from src.agent.sources import SHORT_URL_PREFIX, short_url
+
+MARKER_RE = re.compile(r"\[[^\[\]\n]*\]\([^()\s]*\)")
+
+
+def _result(sentences=6):
+    # Sentences without a full stop before their marker, so a cut lands in a marker
+    return "".join(
+        f"Finding {index} about grid storage prices and their outlook "
+        f"[site{index}.com]({short_url(f'https://site{index}.com/report')}) "
+        for index in range(sentences)
+    )
+
+
+def _assert_markers_whole(truncated, text):
+    body = truncated.removesuffix(" [...]")
+    markers = MARKER_RE.findall(body)
+    assert all(marker in text for marker in markers)
+    # Every short url left is inside a complete marker
+    assert body.count(SHORT_URL_PREFIX) == len(markers)
+    assert MARKER_RE.sub("", body).count("](") == 0
+    assert "[site" not in MARKER_RE.sub("", body)
+
+
+def test_cut_through_a_marker_keeps_it_whole_or_drops_it():
+    text = _result()
+    marker = MARKER_RE.search(text, len(text) // 2)
+    # Cuts at the label, the prefix and the id of a marker in the second half
+    for cut in (marker.start() + 3, marker.start() + 20, marker.end() - 5):
+        truncated = _truncate(text, cut // CHARS_PER_TOKEN)
+
+        assert truncated.endswith(" [...]")
+        _assert_markers_whole(truncated, text)
+
+
+@pytest.mark.parametrize("max_tokens", range(1, len(_result()) // CHARS_PER_TOKEN + 1))
+def test_every_cut_keeps_markers_whole(max_tokens):
+    text = _result()
+    truncated = _truncate(text, max_tokens)
+
+    _assert_markers_whole(truncated, text)
+    assert len(truncated.removesuffix(" [...]")) <= max_tokens * CHARS_PER_TOKEN
+
+
+def test_short_text_is_unchanged():
+    text = _result(1)
+    assert _truncate(text, len(text)) == text
@@ -0,0 +1,24 @@
+"""The offline benchmark runs the graph with the settings it reports."""
+import pytest
+
+from benchmarks.graph_benchmark import benchmark, parse_args
+
+
+def _reflections(max_loops, mode):
+    args = parse_args([
+        "--runs", "2",
+        "--mode", mode,
+        "--llm-latency-ms", "0",
+        "--search-latency-ms", "0",
+        "--initial-queries", "1",
+        "--max-loops", str(max_loops),
+        # Reflection is never satisfied, the loop limit stops the research
+        "--follow-up-loops", "10",
+    ])
+    return benchmark(args)["node_seconds"]["reflection"]["count"]
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_max_loops_limits_the_research_loops(restore_clients, mode):
+    assert _reflections(1, mode) == 2
+    assert _reflections(3, mode) == 6
@@ -0,0 +1,19 @@
+"""Cold import time budget of the graph, measured in fresh interpreters."""
+import os
+
+from benchmarks.import_time import LAZY_MODULES, measure
+
+# Override on slow CI machines, the CLI check uses the same default
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+
+def test_graph_import_is_within_budget_and_keeps_sdks_lazy():
+    report = measure("src.agent.graph", runs=3)
+
+    assert report["lazy_modules_imported"] == [], (
+        f"imported at import time, expected lazy: {report['lazy_modules_imported']} of {LAZY_MODULES}"
+    )
+    assert report["median_ms"] <= BUDGET_MS, (
+        f"median import time {report['median_ms']:.0f} ms is over the {BUDGET_MS:.0f} ms budget, "
+        f"slowest modules: {report['slowest_modules_ms']}"
+    )
@@ -0,0 +1,82 @@
+"""The memorize mark of background jobs only moves once a job succeeded."""
+import functools
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.store.memory import InMemoryStore
+
+from src.agent.configuration import Configuration
+from src.agent.memory import background
+from src.agent.nodes import memorize
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Records the delta every background job is given, fails while `failing` is set."""
+    deltas = []
+    state = {"failing": False}
+
+    def store_new_memories(run_state, configurable, user_id, store):
+        deltas.append([message.content for message in memorize._new_messages(run_state)])
+        if state["failing"]:
+            raise RuntimeError("extraction failed")
+        return []
+
+    monkeypatch.setattr(memorize, "store_new_memories", store_new_memories)
+    monkeypatch.setattr(memorize, "submit_memory_job", functools.partial(background.submit_memory_job, retries=0))
+    monkeypatch.setattr(memorize, "_completed_marks", type(memorize._completed_marks)())
+    return deltas, state
+
+
+def _turns(count):
+    messages = []
+    for turn in range(count):
+        messages += [HumanMessage(f"question {turn}", id=f"h{turn}"), AIMessage(f"answer {turn}", id=f"a{turn}")]
+    return messages
+
+
+def _memorize(messages, mark=None, thread_id="thread"):
+    run_state = {"messages": messages, "last_memorized_message_id": mark, "memorized_research_count": 0}
+    update, job = memorize.submit_in_background(
+        run_state, {"configurable": {"thread_id": thread_id}}, Configuration(), "user", InMemoryStore()
+    )
+    job.exception()
+    return update, job
+
+
+def test_mark_moves_after_the_job_succeeded(jobs):
+    deltas, _ = jobs
+
+    first, _ = _memorize(_turns(1))
+    second, _ = _memorize(_turns(2), first["last_memorized_message_id"])
+
+    # The first turn's job was not done yet when its node returned
+    assert first["last_memorized_message_id"] is None
+    assert second["last_memorized_message_id"] == "a0"
+    assert deltas == [["question 0", "answer 0"], ["question 1", "answer 1"]]
+
+
+def test_failed_job_keeps_the_mark_and_its_delta_is_extracted_again(jobs):
+    deltas, state = jobs
+
+    state["failing"] = True
+    first, job = _memorize(_turns(1))
+    state["failing"] = False
+    second, _ = _memorize(_turns(2), first["last_memorized_message_id"])
+    third, _ = _memorize(_turns(3), second["last_memorized_message_id"])
+
+    assert isinstance(job.exception(), RuntimeError)
+    assert second["last_memorized_message_id"] is None
+    assert deltas[1] == ["question 0", "answer 0", "question 1", "answer 1"]
+    assert third["last_memorized_message_id"] == "a1"
+    assert deltas[2] == ["question 2", "answer 2"]
+
+
+def test_marks_are_kept_per_thread(jobs):
+    deltas, _ = jobs
+
+    _memorize(_turns(1), thread_id="one")
+    update, _ = _memorize(_turns(2), thread_id="two")
+
+    assert update["last_memorized_message_id"] is None
+    assert len(deltas[1]) == 4
@@ -0,0 +1,67 @@
+"""Near-duplicate search queries are dropped at the similarity threshold, in order."""
+import pytest
+
+from src.agent.configuration import Configuration
+from src.agent.utils import dedupe_queries, jaccard_similarity, normalize_query, query_shingles
+
+THRESHOLD = Configuration().query_similarity_threshold
+
+
+def _similarity(left, right):
+    return jaccard_similarity(query_shingles(left), query_shingles(right))
+
+
+def test_normalize_query_ignores_case_punctuation_and_spaces():
+    assert normalize_query("  Grid-scale BATTERY storage,   prices?") == "grid scale battery storage prices"
+    # Word order is kept
+    assert normalize_query("prices storage") != normalize_query("storage prices")
+
+
+def test_jaccard_similarity():
+    assert jaccard_similarity({"a", "b"}, {"a", "b"}) == 1.0
+    assert jaccard_similarity({"a", "b"}, {"b", "c"}) == pytest.approx(1 / 3)
+    assert jaccard_similarity(set(), set()) == 1.0
+    assert jaccard_similarity({"a"}, set()) == 0.0
+
+
+def test_near_duplicate_is_dropped_at_the_threshold():
+    query, near_duplicate = "grid battery storage prices 2025", "Grid battery storage prices in 2025"
+    similarity = _similarity(query, near_duplicate)
+    assert THRESHOLD <= similarity < 1
+
+    assert dedupe_queries([near_duplicate], [query], THRESHOLD) == ([], 1)
+    # The threshold is inclusive
+    assert dedupe_queries([near_duplicate], [query], similarity) == ([], 1)
+    assert dedupe_queries([near_duplicate], [query], similarity + 0.01) == ([near_duplicate], 0)
+
+
+def test_exact_duplicates_are_dropped_at_any_threshold():
+    candidates = ["Offshore wind investment?", "offshore  wind INVESTMENT"]
+    assert dedupe_queries(candidates, ["offshore wind investment"], 1.01) == ([], 2)
+    assert dedupe_queries(candidates, [], 1.01) == (["Offshore wind investment?"], 1)
+
+
+def test_reordered_words_are_not_exact_duplicates():
+    assert dedupe_queries(["lithium vs sodium batteries"], ["sodium vs lithium batteries"], 1.0) == (
+        ["lithium vs sodium batteries"],
+        0,
+    )
+
+
+def test_kept_queries_keep_their_order():
+    candidates = [
+        "hydrogen adoption heavy industry policy",
+        "offshore wind investment by region",
+        "Hydrogen adoption in heavy industry policy",
+        "sodium battery home storage cost",
+        "offshore wind investments by region",
+        "grid battery storage prices 2025",
+    ]
+    kept, skipped = dedupe_queries(candidates, ["grid battery storage prices in 2025"], THRESHOLD)
+
+    assert kept == [
+        "hydrogen adoption heavy industry policy",
+        "offshore wind investment by region",
+        "sodium battery home storage cost",
+    ]
+    assert skipped == 3
@@ -0,0 +1,111 @@
+"""Memoization of the research topic and of its rolling summary."""
+import asyncio
+from collections import OrderedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.agent import utils
+from src.agent.clients import set_client_factories
+from src.agent.utils import aget_research_topic, get_research_topic
+
+
+@pytest.fixture
+def summaries(monkeypatch, restore_clients):
+    """Installs a summary model answering `summary <n> by <model>`, returns its (model, prompt) calls."""
+    calls = []
+
+    def chat_model(model, temperature, max_retries):
+        def summarize(prompt):
+            calls.append((model, prompt))
+            return AIMessage(f"summary {len(calls)} by {model}")
+
+        return RunnableLambda(summarize)
+
+    monkeypatch.setattr(utils, "_transcripts", OrderedDict())
+    set_client_factories(chat_model_factory=chat_model)
+    return calls
+
+
+def _turns(count, thread="thread"):
+    messages = []
+    for turn in range(count):
+        messages += [
+            HumanMessage(f"question {turn}", id=f"{thread}-h{turn}"),
+            AIMessage(f"answer {turn}", id=f"{thread}-a{turn}"),
+        ]
+    return messages
+
+
+def test_transcript_is_extended_with_the_new_messages_only(summaries):
+    first = get_research_topic(_turns(2))
+    transcript = utils._transcripts["thread-h0"]
+    lines = list(transcript.lines)
+
+    topic = get_research_topic(_turns(3))
+
+    assert topic == first + "User: question 2\nAssistant: answer 2\n"
+    assert transcript.lines[:4] == lines
+    assert summaries == []
+
+
+def test_windowed_topic_is_summarized_once(summaries):
+    topic = get_research_topic(_turns(3), max_turns=1, model="flash")
+
+    assert topic == "Summary of the earlier conversation: summary 1 by flash\nUser: question 2\nAssistant: answer 2\n"
+    assert get_research_topic(_turns(3), max_turns=1, model="flash") == topic
+    assert len(summaries) == 1
+
+
+def test_summary_rolls_in_the_turns_that_left_the_window(summaries):
+    get_research_topic(_turns(3), max_turns=1, model="flash")
+    topic = get_research_topic(_turns(4), max_turns=1, model="flash")
+
+    _, prompt = summaries[-1]
+    assert "summary 1 by flash" in prompt
+    assert "question 2" in prompt and "question 1" not in prompt
+    assert topic.startswith("Summary of the earlier conversation: summary 2 by flash\n")
+
+
+def test_cache_is_keyed_by_model(summaries):
+    get_research_topic(_turns(3), max_turns=1, model="flash")
+    topic = get_research_topic(_turns(3), max_turns=1, model="pro")
+
+    model, prompt = summaries[-1]
+    # The summary of the other model is not reused, the older turns are summarized again
+    assert model == "pro"
+    assert "(none)" in prompt and "question 0" in prompt and "question 1" in prompt
+    assert "summary 2 by pro" in topic
+    assert get_research_topic(_turns(3), max_turns=1, model="pro") == topic
+    assert len(summaries) == 2
+
+
+def test_window_requires_a_model(summaries):
+    with pytest.raises(ValueError):
+        get_research_topic(_turns(3), max_turns=1)
+
+
+def test_summary_of_a_replaced_history_is_not_stored(summaries, monkeypatch):
+    replaced = [HumanMessage("other question", id="thread-h0"), AIMessage("other answer", id="other-a0")]
+    summarize = utils.get_chat_model
+
+    def get_chat_model(model, temperature):
+        # The history is replaced while the summary is written, the lock is not held meanwhile
+        get_research_topic(replaced + [HumanMessage("follow up", id="other-h1")])
+        return summarize(model, temperature)
+
+    monkeypatch.setattr(utils, "get_chat_model", get_chat_model)
+    topic = get_research_topic(_turns(3), max_turns=1, model="flash")
+
+    transcript = utils._transcripts["thread-h0"]
+    assert "summary 1 by flash" in topic
+    assert transcript.summary == "" and transcript.summarized_upto == 0
+    assert "other question" in transcript.topic
+
+
+def test_async_topic_shares_the_memoized_summary(summaries):
+    topic = asyncio.run(aget_research_topic(_turns(3), max_turns=1, model="flash"))
+
+    assert get_research_topic(_turns(3), max_turns=1, model="flash") == topic
+    assert len(summaries) == 1
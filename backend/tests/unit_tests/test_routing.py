@@ -0,0 +1,88 @@
+"""Complexity scores and the model tier they route to."""
+import logging
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.agent.configuration import Configuration
+from src.agent.routing import complexity_score, route_model, routing_signals, score_tier
+
+ROUTED = Configuration(model_routing=True)
+
+
+def _signals(topic_words=0, sources=0, loops=0, max_loops=2, research=True):
+    return {"topic_words": topic_words, "sources": sources, "loops": loops, "max_loops": max_loops, "research": research}
+
+
+def _state(words=3, sources=0, loops=0, **state):
+    return {
+        "messages": [HumanMessage(" ".join(["word"] * words))],
+        "source_registry": {f"id{index}": f"https://site{index}.com" for index in range(sources)},
+        "research_loop_count": loops,
+        **state,
+    }
+
+
+def test_complexity_score_bounds():
+    assert complexity_score(_signals()) == 0
+    assert complexity_score(_signals(topic_words=600, sources=150, loops=9)) == pytest.approx(1)
+
+
+def test_complexity_score_weights():
+    assert complexity_score(_signals(topic_words=60)) == pytest.approx(0.4)
+    assert complexity_score(_signals(sources=15)) == pytest.approx(0.3)
+    assert complexity_score(_signals(loops=1, max_loops=2)) == pytest.approx(0.15)
+
+
+def test_answering_without_research_halves_the_score():
+    signals = _signals(topic_words=60, sources=15)
+    assert complexity_score({**signals, "research": False}) == pytest.approx(complexity_score(signals) / 2)
+    # Unknown intent is not discounted
+    assert complexity_score({**signals, "research": None}) == complexity_score(signals)
+
+
+@pytest.mark.parametrize(
+    "score, tier", [(0.0, "light"), (0.25, "light"), (0.26, "standard"), (0.59, "standard"), (0.6, "heavy"), (1.0, "heavy")]
+)
+def test_score_tier_thresholds(score, tier):
+    assert score_tier(score, ROUTED) == tier
+
+
+def test_routing_signals_prefer_the_state_loop_limit():
+    assert routing_signals(_state(), ROUTED, True)["max_loops"] == ROUTED.max_research_loops
+    assert routing_signals(_state(max_research_loops=5), ROUTED, True)["max_loops"] == 5
+    # A limit of 0 must not divide by zero
+    assert routing_signals(_state(max_research_loops=0), ROUTED, True)["max_loops"] == 1
+
+
+def test_route_model_without_routing_keeps_the_default():
+    assert route_model("reflection", _state(words=600, sources=30), Configuration(), "configured") == "configured"
+
+
+@pytest.mark.parametrize(
+    "state, research, model",
+    [
+        (_state(), True, ROUTED.light_model),
+        (_state(words=60), True, ROUTED.standard_model),
+        (_state(words=60, sources=15), True, ROUTED.heavy_model),
+        (_state(words=60, sources=15), False, ROUTED.standard_model),
+    ],
+)
+def test_route_model_tiers(state, research, model):
+    assert route_model("finalize_answer", state, ROUTED, "configured", research=research) == model
+
+
+def test_route_model_heavy_override_only_replaces_the_heavy_tier():
+    heavy_state = _state(words=60, sources=15)
+    assert route_model("reflection", heavy_state, ROUTED, "configured", heavy_model="reasoning") == "reasoning"
+    assert route_model("reflection", _state(), ROUTED, "configured", heavy_model="reasoning") == ROUTED.light_model
+
+
+def test_route_model_logs_the_choice_at_info(caplog):
+    with caplog.at_level(logging.INFO, logger="src.agent.routing"):
+        route_model("reflection", _state(words=60), ROUTED, "configured")
+
+    [record] = caplog.records
+    assert record.levelno == logging.INFO
+    assert (record.node, record.model, record.tier) == ("reflection", ROUTED.standard_model, "standard")
+    assert record.score == pytest.approx(0.4)
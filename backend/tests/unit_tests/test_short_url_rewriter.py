@@ -0,0 +1,103 @@
+"""Streaming short url rewrites, fed in chunks, against the rewrite of the full text."""
+import random
+
+import pytest
+
+from src.agent.sources import SHORT_URL_PREFIX, short_id
+from src.agent.utils import ShortUrlRewriter, replace_short_urls
+
+URLS = ["https://paris.fr/history", "https://insee.fr/population", "https://louvre.fr"]
+REGISTRY = {short_id(url): (url, f"label{index}") for index, url in enumerate(URLS)}
+# Ids that are prefixes of each other, as the run-id based numbering produced
+PREFIX_REGISTRY = {
+    "1-1": ("https://one.com", "one"),
+    "1-10": ("https://ten.com", "ten"),
+    "1-100": ("https://hundred.com", "hundred"),
+}
+
+
+def _answer(registry):
+    keys = list(registry)
+    return (
+        f"Paris is the capital [a]({SHORT_URL_PREFIX}{keys[0]}). "
+        f"It has 2.1 million inhabitants [b]({SHORT_URL_PREFIX}{keys[1]}) "
+        f"[c]({SHORT_URL_PREFIX}{keys[2]}).\n"
+        f"Not a source: {SHORT_URL_PREFIX}zz and {SHORT_URL_PREFIX[:20]}. "
+        f"Again [a]({SHORT_URL_PREFIX}{keys[0]})"
+    )
+
+
+def _stream(registry, chunks):
+    rewriter = ShortUrlRewriter(registry)
+    text = "".join(rewriter.feed(chunk) for chunk in chunks) + rewriter.flush()
+    return text, rewriter.used_sources()
+
+
+def _split(text, sizes):
+    chunks, start = [], 0
+    for size in sizes:
+        chunks.append(text[start:start + size])
+        start += size
+    return chunks + [text[start:]]
+
+
+@pytest.mark.parametrize("registry", [REGISTRY, PREFIX_REGISTRY], ids=["hashed ids", "prefix ids"])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 45, 1000])
+def test_fixed_size_chunks_match_full_rewrite(registry, chunk_size):
+    answer = _answer(registry)
+    chunks = [answer[start:start + chunk_size] for start in range(0, len(answer), chunk_size)]
+
+    assert _stream(registry, chunks) == replace_short_urls(answer, registry)
+
+
+@pytest.mark.parametrize("registry", [REGISTRY, PREFIX_REGISTRY], ids=["hashed ids", "prefix ids"])
+def test_random_chunks_match_full_rewrite(registry):
+    answer = _answer(registry)
+    rng = random.Random(0)
+    for _ in range(200):
+        chunks = _split(answer, [rng.randint(0, 12) for _ in range(rng.randint(0, 60))])
+
+        assert _stream(registry, chunks) == replace_short_urls(answer, registry)
+
+
+def test_short_url_split_at_every_position():
+    short_url = SHORT_URL_PREFIX + "1-10"
+    answer = f"see [ten]({short_url})"
+    for position in range(len(answer) + 1):
+        chunks = [answer[:position], answer[position:]]
+
+        assert _stream(PREFIX_REGISTRY, chunks)[0] == "see [ten](https://ten.com)"
+
+
+def test_id_that_prefixes_a_longer_id_is_held_until_known():
+    rewriter = ShortUrlRewriter(PREFIX_REGISTRY)
+
+    # 1-1 could still become 1-10 or 1-100
+    assert rewriter.feed(f"[one]({SHORT_URL_PREFIX}1-1") == "[one]("
+    assert rewriter.feed("0") == ""
+    assert rewriter.feed(") done") == "https://ten.com) done"
+    assert rewriter.flush() == ""
+
+
+def test_flush_rewrites_a_pending_complete_id():
+    rewriter = ShortUrlRewriter(PREFIX_REGISTRY)
+
+    assert rewriter.feed(f"end {SHORT_URL_PREFIX}1-1") == "end "
+    assert rewriter.flush() == "https://one.com"
+    assert [source["value"] for source in rewriter.used_sources()] == ["https://one.com"]
+
+
+def test_flush_keeps_a_pending_partial_marker():
+    rewriter = ShortUrlRewriter(REGISTRY)
+    partial = f"[a]({SHORT_URL_PREFIX}{next(iter(REGISTRY))[:4]}"
+
+    assert rewriter.feed("cut " + partial) == "cut [a]("
+    assert rewriter.flush() == partial[len("[a]("):]
+    assert rewriter.used_sources() == []
+
+
+def test_empty_registry_passes_chunks_through():
+    rewriter = ShortUrlRewriter({})
+
+    assert rewriter.feed(SHORT_URL_PREFIX + "1") == SHORT_URL_PREFIX + "1"
+    assert rewriter.flush() == ""
@@ -0,0 +1,75 @@
+"""Short ids of the source registry, with forced collisions."""
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from src.agent import sources
+from src.agent.sources import SHORT_URL_PREFIX, merge_source_registry, register_citations
+from src.agent.utils import get_citations, replace_short_urls, resolve_urls
+
+URLS = [f"https://site{index}.com/page" for index in range(40)]
+
+
+@pytest.fixture
+def one_digit_ids(monkeypatch):
+    # 16 possible ids for 40 urls, collisions are certain
+    monkeypatch.setattr(sources, "SHORT_ID_LENGTH", 1)
+
+
+def _response(urls):
+    chunks = [SimpleNamespace(web=SimpleNamespace(uri=url, title=f"site{index}.com")) for index, url in enumerate(urls)]
+    supports = [
+        SimpleNamespace(segment=SimpleNamespace(start_index=index, end_index=index + 1), grounding_chunk_indices=[index])
+        for index in range(len(urls))
+    ]
+    metadata = SimpleNamespace(grounding_chunks=chunks, grounding_supports=supports)
+    return SimpleNamespace(candidates=[SimpleNamespace(grounding_metadata=metadata)])
+
+
+def test_colliding_urls_get_distinct_short_urls(one_digit_ids):
+    response = _response(URLS)
+    resolved = resolve_urls(response.candidates[0].grounding_metadata.grounding_chunks)
+
+    assert len(set(resolved.values())) == len(URLS)
+    assert any(len(short_url) > len(SHORT_URL_PREFIX) + 1 for short_url in resolved.values())
+
+
+def test_colliding_urls_are_cited_and_resolved_to_their_own_url(one_digit_ids):
+    response = _response(URLS)
+    citations = get_citations(response, resolve_urls(response.candidates[0].grounding_metadata.grounding_chunks))
+    registry = register_citations(citations)
+    text = " ".join(f"[{segment['label']}]({segment['short_url']})" for citation in citations for segment in citation["segments"])
+
+    rewritten, used = replace_short_urls(text, registry)
+
+    assert len(registry) == len(URLS)
+    assert rewritten == " ".join(f"[site{index}]({url})" for index, url in enumerate(URLS))
+    assert [source["value"] for source in used] == URLS
+
+
+def test_short_ids_are_the_same_across_branches():
+    first = resolve_urls(_response(URLS[:3]).candidates[0].grounding_metadata.grounding_chunks)
+    second = resolve_urls(_response(URLS[2:5]).candidates[0].grounding_metadata.grounding_chunks)
+
+    assert first[URLS[2]] == second[URLS[2]]
+
+
+def test_registry_logs_a_collision_between_branches(caplog):
+    left = {"ab": ("https://first.com", "first")}
+    right = {"ab": ("https://second.com", "second"), "cd": ("https://third.com", "third")}
+
+    with caplog.at_level(logging.ERROR, logger="src.agent.sources"):
+        merged = merge_source_registry(left, right)
+
+    assert merged == {"ab": ("https://first.com", "first"), "cd": ("https://third.com", "third")}
+    assert "collision" in caplog.text and "https://second.com" in caplog.text
+
+
+def test_registry_merges_the_same_url_quietly(caplog):
+    # Checkpoints give the tuples back as lists
+    with caplog.at_level(logging.ERROR, logger="src.agent.sources"):
+        merged = merge_source_registry({"ab": ["https://first.com", "first"]}, {"ab": ("https://first.com", "first")})
+
+    assert merged == {"ab": ("https://first.com", "first")}
+    assert caplog.text == ""